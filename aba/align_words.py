@@ -1,8 +1,10 @@
 import os
 import glob
 import argparse
+import multiprocessing
 
-from .utils.strings import align_words
+from .utils.vocab import Vocabulary
+from .utils.strings import align_words, score_cache, init_submat_chars, init_align_worker, MAX_CELLS
 from .utils.saving import lst_to_tsv
 
 def run():
@@ -17,6 +19,12 @@ def run():
 	parser.add_argument('-d', '--dst_dir', type = str,
 		help = 'destination directory for dictionary file',
 		default = default_dst_dir)
+	parser.add_argument('-m', '--max_cells', type = int,
+		help = 'number of matrix cells above which lines are aligned in linear space',
+		default = MAX_CELLS)
+	parser.add_argument('-j', '--jobs', type = int,
+		help = 'number of worker processes aligning chunks of lines',
+		default = 1)
 	args = parser.parse_args()
 
 	if not os.path.exists(args.dst_dir):
@@ -24,12 +32,27 @@ def run():
 
 	files = [f for f in glob.glob(os.path.join(args.src_dir, '*.tsv'))]
 
+	# word pair scores shared by all files
+	cache = score_cache(submat = init_submat_chars(), mode = 'words', vocab = Vocabulary())
+
+	# worker processes shared by all files
+	pool = None
+	if args.jobs > 1:
+		pool = multiprocessing.Pool(args.jobs, initializer = init_align_worker)
+
 	for file in files:
 		filename = os.path.basename(file)
 		filepath = os.path.join(args.dst_dir, filename)
 		print(f'Aligning {filename} by words...')
-		aligned_words = align_words(file)
+		aligned_words = align_words(file, cache = cache, max_cells = args.max_cells, pool = pool)
 		lst_to_tsv(aligned_words, filepath)
+
+	if pool is None:
+		info = cache.cache_info()
+		print(f'Word pair scores : {info.hits} hits, {info.misses} misses, {info.currsize} cached')
+	else:
+		pool.close()
+		pool.join()
 		
 if __name__ == '__main__':
 	run()
\ No newline at end of file
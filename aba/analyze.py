@@ -1,7 +1,7 @@
 import argparse, os
 
-from .utils.saving import extract_dic
-from .utils.modern import label_dic
+from .utils.saving import extract_dic, extract_dic_incremental
+from .utils.modern import label_dic, read_labeled_dic, alignment_memo, ALIGN_MEMO_PATH
 
 def run():
 
@@ -19,12 +19,37 @@ def run():
 	parser.add_argument('-l', '--lab_dic_path', type = str,
 		help = 'filename for dictionary file',
 		default = default_lab_dic_path)
+	parser.add_argument('-j', '--jobs', type = int,
+		help = 'number of worker processes counting files and aligning entries',
+		default = 1)
+	parser.add_argument('-a', '--align_memo', type = str,
+		help = 'persistent memo of char alignments (sqlite file), shared with modernize_corpus',
+		default = ALIGN_MEMO_PATH)
+	parser.add_argument('--no_align_memo', action = 'store_true',
+		help = 'align all entries, without memo')
+	parser.add_argument('-i', '--incremental', action = 'store_true',
+		help = 'only count files new or changed since the last run with -i, and label new entries')
+	parser.add_argument('-m', '--manifest_path', type = str,
+		help = 'manifest of the files counted (with -i), their counts being kept in MANIFEST_PATH.parts',
+		default = None)
 
 	args = parser.parse_args()
 
 	# analyze corpus
-	extract_dic(args.src_dir, args.raw_dic_path)
-	label_dic(args.raw_dic_path, args.lab_dic_path)
+	labeled = None
+	if args.incremental:
+		# entries labeled by the last run
+		if os.path.exists(args.raw_dic_path) and os.path.exists(args.lab_dic_path):
+			labeled = read_labeled_dic(args.lab_dic_path, args.raw_dic_path)
+		manifest_path = args.manifest_path or args.raw_dic_path + '.manifest.json'
+		counted = extract_dic_incremental(args.src_dir, args.raw_dic_path, manifest_path, jobs = args.jobs)
+		print(f'{len(counted)} new or changed files counted')
+	else:
+		extract_dic(args.src_dir, args.raw_dic_path, jobs = args.jobs)
+	memo = None if args.no_align_memo else alignment_memo(args.align_memo)
+	label_dic(args.raw_dic_path, args.lab_dic_path, jobs = args.jobs, memo = memo, labeled = labeled)
+	if memo is not None:
+		memo.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,30 @@
+import argparse
+
+from .utils.modern import read_dics, MODERN_DIC_PATH, LEARN_DIC_PATH, NAME_DIC_PATH, BUNDLE_PATH
+from .utils.bundle import build_bundle
+
+def run():
+
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-m', '--modern_dic_path', type = str,
+		help = 'modern dictionary file',
+		default = MODERN_DIC_PATH)
+	parser.add_argument('-l', '--learn_dic_path', type = str,
+		help = 'learned dictionary file',
+		default = LEARN_DIC_PATH)
+	parser.add_argument('-n', '--name_dic_path', type = str,
+		help = 'name dictionary file',
+		default = NAME_DIC_PATH)
+	parser.add_argument('-o', '--bundle_path', type = str,
+		help = 'compiled dictionaries file',
+		default = BUNDLE_PATH)
+	args = parser.parse_args()
+
+	# compile dictionaries
+	print(f'Compiling dictionaries to {args.bundle_path}...')
+	build_bundle(args.bundle_path, *read_dics(args.modern_dic_path, args.learn_dic_path, args.name_dic_path))
+	print('Done.')
+
+
+if __name__ == '__main__':
+	run()
\ No newline at end of file
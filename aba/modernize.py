@@ -1,18 +1,47 @@
 import argparse
 import os
 
-from .utils.modern import modernize_sentence
+from .utils.modern import Modernizer, dictionary_fingerprint
+from .utils.memo import WordMemo, MEMO_SIZE
 
 def run():
 	
-	modern_dic_path = os.path.join('data','dic_morphalou.tsv')
-	learn_dic_path 	= os.path.join('data','dic_p17.tsv')
-	name_dic_path 	= os.path.join('data','dic_resources.txt')
-
 	parser = argparse.ArgumentParser()
-	parser.add_argument('text_old_path', type = str,
+	parser.add_argument('text_old_path', type = str, nargs = '?',
 		help = 'path to the original text')
+	parser.add_argument('-v', '--vocabulary_first', action = 'store_true',
+		help = 'modernize each distinct word once, then rewrite the text by lookup')
+	parser.add_argument('-j', '--jobs', type = int,
+		help = 'number of worker processes modernizing distinct words (with -v)',
+		default = 1)
+	parser.add_argument('-m', '--max_candidates', type = int,
+		help = 'maximal number of rule candidates tried per word (all by default)')
+	parser.add_argument('-c', '--memo', type = str,
+		help = 'persistent memo of modernized words (sqlite file), emptied when dictionaries change')
+	parser.add_argument('--memo_size', type = int,
+		help = 'number of words kept in the memo',
+		default = MEMO_SIZE)
+	parser.add_argument('--warm_memo', action = 'store_true',
+		help = 'only add the words of the text to the memo, without saving the modernized text')
+	parser.add_argument('--clear_memo', action = 'store_true',
+		help = 'empty the memo first')
 	args = parser.parse_args()
+	for flag in ('warm_memo', 'clear_memo'):
+		if getattr(args, flag) and not args.memo:
+			parser.error(f'--{flag} requires -c/--memo')
+
+	# persistent memo
+	memo = None
+	if args.memo:
+		memo = WordMemo(args.memo, dictionary_fingerprint(max_candidates = args.max_candidates), args.memo_size)
+		if args.clear_memo:
+			print(f'clearing {args.memo}')
+			memo.clear()
+	if args.text_old_path is None:
+		if memo is None:
+			parser.error('text_old_path is required')
+		memo.close()
+		return
 
 	# output
 	if os.path.isdir('result') == False:
@@ -21,18 +50,36 @@ def run():
 
 	# read files
 	text_old	= [line.strip() for line in open(args.text_old_path, 'r', encoding = 'utf8')]
-	modern_dic 	= {line.strip() for line in open(modern_dic_path, 'r', encoding = 'utf8')}
-	name_dic 	= {line.strip() for line in open(name_dic_path, 'r', encoding = 'utf8')}
-	learn_dic 	= {old:new for (old, new, _) in [l.split('\t') for l in open(learn_dic_path, 'r', encoding = 'utf8')]}
+	modernizer 	= Modernizer.load(memo = memo, max_candidates = args.max_candidates)
 
 	# modernize
 	print(f'translating {args.text_old_path}')
-	text_mod 	= [modernize_sentence(s, modern_dic, learn_dic, name_dic = name_dic) for s in text_old]
+	if args.warm_memo:
+		_, stats = modernizer.modernize_vocabulary_first(text_old, jobs = args.jobs)
+		print_vocabulary_stats(stats)
+		print(f'{len(memo)} words in {args.memo}')
+		memo.close()
+		return
+	if args.vocabulary_first:
+		text_mod, stats = modernizer.modernize_vocabulary_first(text_old, jobs = args.jobs)
+		print_vocabulary_stats(stats)
+	else:
+		text_mod = list(modernizer.modernize_many(text_old))
 
 	# save modernized text
 	print(f'saving to {text_mod_path}')
 	open(text_mod_path, 'w', encoding = 'utf8').write('\n'.join(text_mod))
+	if memo is not None:
+		memo.close()
 	
 
+def print_vocabulary_stats(stats):
+	print(
+		f'{stats["tokens"]} tokens, {stats["types"]} types '
+		f'(type/token ratio {stats["ratio"]:.3f})\n'
+		f'types modernized in {stats["seconds"]:.2f} s, '
+		f'about {stats["saved"]:.2f} s saved over modernizing each token')
+
+
 if __name__ == '__main__':
 	run()
\ No newline at end of file
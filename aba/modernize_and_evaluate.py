@@ -1,20 +1,17 @@
 import argparse
 import os
 
-from .utils.modern import modernize_sentence
-from .utils.evaluation import cacc, wacc
+from .utils.modern import Modernizer
+from .utils.evaluation import evaluate, format_breakdown
 
 def run():
-	# need to clean this code up to line 35, as it is copied from modernize_corpus.py
-	modern_dic_path = os.path.join('data','dic_morphalou.tsv')
-	learn_dic_path 	= os.path.join('data','dic_p17.tsv')
-	name_dic_path 	= os.path.join('data','dic_resources.txt')
-
 	parser = argparse.ArgumentParser()
 	parser.add_argument('text_old_path', type = str,
 		help = 'path to the original text')
 	parser.add_argument('-n', '--text_new_path', type = str,
 		help = 'path to the modernized text for evaluation')
+	parser.add_argument('-b', '--breakdown', action = 'store_true',
+		help = 'also print accuracies by sentence length')
 	args = parser.parse_args()
 
 	# output
@@ -24,13 +21,11 @@ def run():
 
 	# read files
 	text_old	= [line.strip() for line in open(args.text_old_path, 'r', encoding = 'utf8')]
-	modern_dic 	= {line.strip() for line in open(modern_dic_path, 'r', encoding = 'utf8')}
-	name_dic 	= {line.strip() for line in open(name_dic_path, 'r', encoding = 'utf8')}
-	learn_dic 	= {old:new for (old, new, _) in [l.split('\t') for l in open(learn_dic_path, 'r', encoding = 'utf8')]}
+	modernizer 	= Modernizer.load()
 
 	# modernize
 	print(f'translating {args.text_old_path}')
-	text_mod 	= [modernize_sentence(s, modern_dic, learn_dic, name_dic = name_dic) for s in text_old]
+	text_mod 	= list(modernizer.modernize_many(text_old))
 
 	# save modernized text
 	print(f'saving to {text_mod_path}')
@@ -40,19 +35,22 @@ def run():
 	if args.text_new_path:
 		print(f'comparing to {args.text_new_path}')
 		text_new 	= [line.strip() for line in open(args.text_new_path, 'r', encoding = 'utf8')]
-		result_aba 	= [(mod, new) for (mod, new) in zip(text_mod, text_new)]
-		result_base = [(old, new) for (old, new) in zip(text_old, text_new)]
+		result_aba 	= evaluate([(mod, new) for (mod, new) in zip(text_mod, text_new)])
+		result_base = evaluate([(old, new) for (old, new) in zip(text_old, text_new)])
 		# print evaluation
 		print(
 			f'base :\n'
-			f'cacc = {cacc(result_base) * 100}\n'
-			f'wacc = {wacc(result_base) * 100}'
+			f'cacc = {result_base["cacc"] * 100}\n'
+			f'wacc = {result_base["wacc"] * 100}'
 		)
 		print(
 			f'aba :\n'
-			f'cacc = {cacc(result_aba) * 100}\n'
-			f'wacc = {wacc(result_aba) * 100}'
+			f'cacc = {result_aba["cacc"] * 100}\n'
+			f'wacc = {result_aba["wacc"] * 100}'
 		)
+		if args.breakdown:
+			print(f'base, by sentence length\n{format_breakdown(result_base["lengths"])}')
+			print(f'aba, by sentence length\n{format_breakdown(result_aba["lengths"])}')
 
 if __name__ == '__main__':
 	run()
\ No newline at end of file
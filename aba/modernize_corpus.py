@@ -1,21 +1,62 @@
 import os
 import re
 import glob
+import time
+import argparse
+import tempfile
+import itertools
+import statistics
+import multiprocessing
+from contextlib import nullcontext
 
-from .utils.modern import find_diffs, modernize
-from .utils.strings import align_chars, init_submat_chars
-from .utils.evaluation import cacc, wacc
+from .utils.modern import label_pairs, alignment_memo, Modernizer, MODERN_DIC_PATH, NAME_DIC_PATH, ALIGN_MEMO_PATH
+from .utils.evaluation import evaluate, format_breakdown
 from .utils.saving import lst_to_tsv
+from .utils.bundle import build_bundle, load_bundle
+from .utils.corpus import CorpusFile, read_pairs
+
+# results of a fold, in report order
+FOLD_SYSTEMS = ('baseline', 'wikisource', 'rules')
+FOLD_STEPS = ('data', 'modernize', 'evaluate')
+
+# dictionaries of fold worker processes
+worker = {}
 
 
 def run():
 
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-v', '--vocabulary_first', action = 'store_true',
+		help = 'modernize each distinct test word once, then test words by lookup (single split only)')
+	parser.add_argument('-j', '--jobs', type = int,
+		help = 'number of worker processes modernizing distinct words (with -v) and aligning wrong predictions, or folds',
+		default = 1)
+	parser.add_argument('-k', '--folds', type = int,
+		help = 'cross-validate on K folds of the corpus lines instead of a single split, and print a report of the folds')
+	parser.add_argument('-s', '--sample', type = int,
+		help = 'test on SAMPLE lines drawn at random from the test part of each file (of each fold, with -k)')
+	parser.add_argument('-b', '--breakdown', action = 'store_true',
+		help = 'also print accuracies by corpus file and by word length (single split only)')
+	parser.add_argument('-a', '--align_memo', type = str,
+		help = 'persistent memo of char alignments (sqlite file), shared with analyze (single split only)',
+		default = ALIGN_MEMO_PATH)
+	parser.add_argument('--no_align_memo', action = 'store_true',
+		help = 'align all wrong predictions, without memo (single split only)')
+	args = parser.parse_args()
+	if args.folds is not None:
+		if args.folds < 2:
+			parser.error('-k/--folds must be at least 2')
+		for flag, given in (('-v/--vocabulary_first', args.vocabulary_first), ('-b/--breakdown', args.breakdown),
+			('-a/--align_memo', args.align_memo != ALIGN_MEMO_PATH), ('--no_align_memo', args.no_align_memo)):
+			if given:
+				parser.error(f'{flag} only applies to a single split, not with -k/--folds')
+
 	# parameters
 	ratio 		= 0.6
 
 	# paths
-	modern 		= 'data/dic_morphalou.tsv'
-	name_dic	= 'data/dic_resources.txt'
+	modern 		= MODERN_DIC_PATH
+	name_dic	= NAME_DIC_PATH
 	wiki 		= 'data/dic_wikisource.tsv'
 	corpus 		= 'data/PARALLEL17_words'
 	result_base = 'result/modernized_baseline.tsv'
@@ -31,102 +72,243 @@ def run():
 	modern 		= {line.strip() for line in open(modern, 'r', encoding = 'utf8')}
 	name 		= {line.strip() for line in open(name_dic, 'r', encoding = 'utf8')}
 
+	if args.folds is not None:
+		print(f'cross-validating on {args.folds} folds')
+		start = time.perf_counter()
+		results = []
+		print(fold_header())
+		for res in cross_validate(corpus, args.folds, modern, wiki, name, jobs = args.jobs, sample = args.sample):
+			print(format_fold(res))
+			results.append(res)
+		print(format_folds(results, time.perf_counter() - start))
+		return
+
 	# generate data
 	print('generating learning and test data')
-	learn, test = generate_data(corpus, ratio = ratio)
+	learn, test, test_files = generate_data(corpus, ratio = ratio, sample = args.sample)
 	baseline 	= [(old, new) for (old, new) in test]
 
 	# modernize
 	print('modernizing test data using wikisource')
-	modern_wiki = modernize_list(test, modern, wiki, name_dic = name, rules = False)
+	modernize = modernize_list_vocabulary_first if args.vocabulary_first else modernize_list
+	modern_wiki = modernize(test, Modernizer(modern, wiki, name, rules = False), jobs = args.jobs)
 	print('modernizing test data using rules')
-	modern_rule = modernize_list(test, modern, learn, name_dic = name, rules = True)
+	modern_rule = modernize(test, Modernizer(modern, learn, name, rules = True), jobs = args.jobs)
 
 	# save results
 	lst_to_tsv(modern_wiki, result_base)
 	lst_to_tsv(modern_rule, result_rule)
 
 	# label missing rules
-	label_rules(modern_rule, result_lab)
+	memo = None if args.no_align_memo else alignment_memo(args.align_memo)
+	label_rules(modern_rule, result_lab, jobs = args.jobs, memo = memo)
+	if memo is not None:
+		memo.close()
 
 	# evaluate
 	print('evaluating results')
 	
-	result_base = [(mod, new) for (mod, new) in baseline]
-	result_wiki = [(mod, new) for (old, mod, new) in modern_wiki]
-	result_aba  = [(mod, new) for (old, mod, new) in modern_rule]
+	result_base = evaluate([(mod, new) for (mod, new) in baseline], jobs = args.jobs, files = test_files)
+	result_wiki = evaluate([(mod, new) for (old, mod, new) in modern_wiki], jobs = args.jobs, files = test_files)
+	result_aba  = evaluate([(mod, new) for (old, mod, new) in modern_rule], jobs = args.jobs, files = test_files)
 
 	# print results
 	print(
 		f'---'
 		f'baseline\n'
-		f'cacc = {cacc(result_base) * 100}\n'
-		f'wacc = {wacc(result_base) * 100}\n'
+		f'cacc = {result_base["cacc"] * 100}\n'
+		f'wacc = {result_base["wacc"] * 100}\n'
 		f'---'
 		f'using wikisource\n'
-		f'cacc = {cacc(result_wiki) * 100}\n'
-		f'wacc = {wacc(result_wiki) * 100}\n'
+		f'cacc = {result_wiki["cacc"] * 100}\n'
+		f'wacc = {result_wiki["wacc"] * 100}\n'
 		f'---'
 		f'using rules\n'
-		f'cacc = {cacc(result_aba) * 100}\n'
-		f'wacc = {wacc(result_aba) * 100}\n'
+		f'cacc = {result_aba["cacc"] * 100}\n'
+		f'wacc = {result_aba["wacc"] * 100}\n'
 		f'---')
+	if args.breakdown:
+		for name, result in (('baseline', result_base), ('using wikisource', result_wiki), ('using rules', result_aba)):
+			print(f'{name}, by file\n{format_breakdown(result["files"])}')
+			print(f'{name}, by word length\n{format_breakdown(result["lengths"])}')
+
 
+def generate_data(corpus, ratio = 0.5, sample = None, seed = 0):
+	"""Returns (learning dictionary, test data, file of each test pair) of corpus files
 
-def generate_data(corpus, ratio = 0.5):
+	A `ratio` of the lines of odd numbered files (the first ones) and of even numbered files
+	(the last ones) are learned, other lines are tested.
+
+	:param sample: number of test lines drawn at random from each file, None for all
+	:param seed: seed of the sample
+	"""
 	learn = {}
 	test = []
+	test_files = []
 	files = [f for f in glob.glob(corpus + '/*.tsv')]
 
 	for file_no, filename in enumerate(files, start = 1):
-		with open(filename, 'r', encoding = 'utf8') as file:
+		with CorpusFile(filename) as file:
 
 			# calculate ratio (odd : learn_ratio, even : 1 - learn_ratio)
 			learn_ratio = abs(ratio - (not file_no % 2))
-			# get total number of lines
-			nb_lines = sum(1 for line in file)
-			# rewind
-			file.seek(0)
-
-			for line_no, line in enumerate(file.readlines(), start = 1):			
-				(old, new) = line.rstrip().split('\t')
-
-				# odd numbered file
-				if (file_no % 2):
-					# first part to learning dictionary
-					if line_no <= nb_lines * learn_ratio:
-						learn[old] = new
-					# second part to test
-					else:
-						test.append((old, new))
-
-				# even numbered file
-				else: 
-					# first part to test
-					if line_no <= nb_lines * learn_ratio:
-						test.append((old, new))
-					# second part to learning dictionary
-					else:
-						learn[old] = new
-
-	return learn, test
-
-
-def modernize_list(test, modern_dic, learning_dic, name_dic = {}, rules = True):
+			# number of lines of the first part
+			split = int(len(file) * learn_ratio)
+
+			# odd numbered file : first part to learning dictionary, second part to test
+			if (file_no % 2):
+				learn_part, test_part = (0, split), (split, len(file))
+			# even numbered file : first part to test, second part to learning dictionary
+			else:
+				test_part, learn_part = (0, split), (split, len(file))
+
+			for (old, new) in read_pairs(file.lines(*learn_part)):
+				learn[old] = new
+			lines = file.lines(*test_part) if sample is None else file.sample(sample, *test_part, seed = seed)
+			size = len(test)
+			test += read_pairs(lines)
+			test_files += [os.path.basename(filename)] * (len(test) - size)
+
+	return learn, test, test_files
+
+
+def generate_folds(corpus, folds, sample = None, seed = 0):
+	"""Yields (fold number, learning dictionary, test data, seconds spent building them) of folds of corpus files
+
+	Lines of each file are split into `folds` consecutive parts :
+	fold k is tested on the k-th part of every file, and learns from the others.
+
+	:param sample: number of test lines drawn at random from the k-th part of each file, None for all
+	:param seed: seed of the sample
+	"""
+	files = [CorpusFile(filename) for filename in sorted(glob.glob(corpus + '/*.tsv'))]
+
+	for k in range(folds):
+		start = time.perf_counter()
+		learn = {}
+		test = []
+		for file in files:
+			first, last = file.fold(k, folds)
+			for (old, new) in read_pairs(itertools.chain(file.lines(0, first), file.lines(last))):
+				learn[old] = new
+			lines = file.lines(first, last) if sample is None else file.sample(sample, first, last, seed = seed)
+			test += read_pairs(lines)
+		yield k + 1, learn, test, time.perf_counter() - start
+
+	for file in files:
+		file.close()
+
+
+def cross_validate(corpus, folds, modern, wiki, name, jobs = 1, sample = None):
+	"""Yields results of the folds of corpus files (see generate_folds and evaluate_fold), in order
+
+	Folds are modernized and evaluated in `jobs` worker processes. Modern, wikisource
+	and name dictionaries are compiled to a temporary bundle, mapped by every worker
+	instead of being copied to each one.
+	"""
+	with tempfile.TemporaryDirectory() as tmp:
+		bundle = os.path.join(tmp, 'folds.bundle')
+		build_bundle(bundle, modern, wiki, name)
+		dics = load_bundle(bundle)
+		with multiprocessing.Pool(jobs, initializer = init_fold_worker, initargs = dics) if jobs > 1 else nullcontext() as pool:
+			if pool is None:
+				init_fold_worker(*dics)
+			data = generate_folds(corpus, folds, sample = sample)
+			yield from (pool.imap(evaluate_fold, data) if pool is not None else map(evaluate_fold, data))
+		# unmap the bundle before removing it
+		worker.clear()
+		del dics
+
+
+def init_fold_worker(modern, wiki, name):
+	worker.update(modern = modern, wiki = wiki, name = name)
+
+
+def evaluate_fold(fold):
+	"""Returns results of a fold (fold number, learning dictionary, test data, seconds spent building them)
+
+	The result is {'fold', 'learn': number of learned words, 'test': number of test words,
+	'baseline', 'wikisource', 'rules': accuracies (see evaluate), 'seconds': {step: seconds}}.
+	"""
+	k, learn, test, seconds = fold
+	res = {'fold': k, 'learn': len(learn), 'test': len(test), 'seconds': {'data': seconds}}
+	# modernize
+	start = time.perf_counter()
+	modern_wiki = modernize_list(test, Modernizer(worker['modern'], worker['wiki'], worker['name'], rules = False))
+	modern_rule = modernize_list(test, Modernizer(worker['modern'], learn, worker['name'], rules = True))
+	res['seconds']['modernize'] = time.perf_counter() - start
+	# evaluate
+	start = time.perf_counter()
+	res['baseline'] = evaluate(test)
+	res['wikisource'] = evaluate([(mod, new) for (old, mod, new) in modern_wiki])
+	res['rules'] = evaluate([(mod, new) for (old, mod, new) in modern_rule])
+	res['seconds']['evaluate'] = time.perf_counter() - start
+	return res
+
+
+def fold_header():
+	return '\t'.join(['fold', 'learn', 'test']
+		+ [f'{system} {metric}' for system in FOLD_SYSTEMS for metric in ('cacc', 'wacc')]
+		+ [f'{step} (s)' for step in FOLD_STEPS])
+
+
+def format_fold(res):
+	"""Returns the report line of the results of a fold"""
+	return '\t'.join([str(res['fold']), str(res['learn']), str(res['test'])]
+		+ [f'{res[system][metric] * 100:.2f}' for system in FOLD_SYSTEMS for metric in ('cacc', 'wacc')]
+		+ [f'{res["seconds"][step]:.2f}' for step in FOLD_STEPS])
+
+
+def format_folds(results, seconds):
+	"""Returns the report of accuracies over folds : mean and standard deviation of the folds,
+	accuracies of the words of all folds, and times
+	"""
+	lines = []
+	for name, aggregate in (('mean', statistics.mean), ('stdev', statistics.pstdev)):
+		lines.append('\t'.join([name, '', '']
+			+ [f'{aggregate([res[system][metric] for res in results]) * 100:.2f}' for system in FOLD_SYSTEMS for metric in ('cacc', 'wacc')]
+			+ [f'{aggregate([res["seconds"][step] for res in results]):.2f}' for step in FOLD_STEPS]))
+	# all words : means of folds weighted by their number of words
+	test = sum(res['test'] for res in results)
+	lines.append('\t'.join(['all', '', str(test)]
+		+ [f'{sum(res[system][metric] * res["test"] for res in results) / test * 100:.2f}' for system in FOLD_SYSTEMS for metric in ('cacc', 'wacc')]
+		+ [f'{sum(res["seconds"][step] for res in results):.2f}' for step in FOLD_STEPS]))
+	lines.append(f'{len(results)} folds in {seconds:.2f} s')
+	return '\n'.join(lines)
+
+
+def modernize_list(test, modernizer, jobs = 1):
 	result = []
 	for (old, new) in test:
-		mod = modernize(old, modern_dic, learning_dic, name_dic)
+		mod = modernizer.modernize_word(old)
 		result.append((old, mod, new))
 	return result
 
 
-def label_rules(result, filename):
+def modernize_list_vocabulary_first(test, modernizer, jobs = 1):
+	# modernize each distinct word once
+	start = time.perf_counter()
+	types = list({old for (old, _) in test})
+	mods = dict(zip(types, modernizer.modernize_words(types, jobs = jobs)))
+	seconds = time.perf_counter() - start
+	saved = seconds / len(types) * (len(test) - len(types)) if types else 0
+	print(f'{len(test)} tokens, {len(types)} types (type/token ratio {len(types) / max(len(test), 1):.3f}), '
+		f'types modernized in {seconds:.2f} s, about {saved:.2f} s saved over modernizing each token')
+	# modernize words by lookup
+	return [(old, mods[old], new) for (old, new) in test]
+
+
+def label_rules(result, filename, jobs = 1, memo = None):
+	"""Writes differences of wrong predictions (old, mod, new) to filename
+
+	:param jobs: number of worker processes aligning predictions
+	:param memo: persistent memo of char alignments (see alignment_memo), None for none
+	"""
+	wrong = [(old, mod, new) for (old, mod, new) in result if mod != new]
+	labeled = label_pairs(((mod, new) for (_, mod, new) in wrong), jobs = jobs, memo = memo)
 	with open(filename, 'w', encoding = 'utf8') as file:
-		for (old, mod, new) in result:
-			if mod == new:
-				continue
-			mod, new = align_chars(mod, new, submat = init_submat_chars())
-			rules = [(o, n, rules) for o, n, rules in find_diffs(mod, new)[1]]
+		for (old, _, _), (mod, new, (_, diffs)) in zip(wrong, labeled):
+			rules = [(o, n, rules) for o, n, rules in diffs]
 			mod = mod.replace('¤','')
 			new = new.replace('¤','')
 			file.write(f'{old}\t{mod}\t{new}\t{rules}\n')
@@ -1,217 +1,188 @@
-import glob, os, re, subprocess
-import pandas as pd
-from shutil import copyfile
+import os
+import re
+import glob
+import argparse
+import multiprocessing
+from collections import Counter
+from contextlib import nullcontext
+from functools import partial
+
+from .utils.vocab import Vocabulary
+from .utils.strings import align_line, score_cache, init_submat_chars, MAX_CELLS
+from .utils.modern import label_pairs
+from .utils.saving import lst_to_tsv
+from .utils.corpus import CorpusFile
 
 # Pour lancer ce script :
 # python -m aba.rules_extract
 
 # Auparavant, mettre le corpus (fichiers TSV) à traiter dans le dossier corpus (frère du dossier aba)
 # Ces fichiers TSV peuvent contenir 2 colonnes ou plus
-# (1e : normalisée ; 2e : originale ; si inverse remplacer 
-#           outputFile.writelines(res.group(2)+"\t"+res.group(1)+"\n")
-# par 
-#           outputFile.writelines(res.group(1)+"\t"+res.group(2)+"\n")
-# )
-
-firstTime = True
-#firstTime = False
-
-download_folder = os.path.join(os.path.join('download','PARALLEL17'),'corpus_tsv')
-
-def empty_download_folder(download_folder):
-    # Empty download folder
-    download_folder_files = glob.glob(os.path.join(download_folder,'*'))
-    for f in download_folder_files:
-        ## print("Removing file " + f + " from download folder")
-        os.remove(f)
-
-# Copying source files from the corpus folder
-corpus_folder = os.path.join('corpus','*.tsv')
-
-print(corpus_folder)
-files = glob.glob(corpus_folder)
-
-"""
-files = [
-'splitByYear-LowerThan1630.tsv',
-'splitByYear-LowerThan1660.tsv',
-'splitByYear-LowerThan1670.tsv',
-'splitByYear-LowerThan1680.tsv',
-'splitByYear-LowerThan1700.tsv'
-]
-"""
-ruleTable = {}
-
-fileNb = 0
-
-bigRuleFile = open('dic_p17_labeled.tsv','w',encoding='utf-8')
-
-fileSize = {}
-
-
-##print("Starting to copy files")
-for f in files:
-    #f = os.path.join("corpus", f)
-    empty_download_folder(download_folder)
-    
-    filename = os.path.basename(f)
-    print(filename)
-    ##print("Copying file " + filename + " to download folder")
-    ##print("New file:" + os.path.join(download_folder, filename))
-    #copyfile(f, os.path.join(download_folder, filename))
-    
-
-    outputFile = open(os.path.join(download_folder, filename), "w", encoding="utf-8")
-    for line in open(f, "r", encoding="utf-8"):
-       #res = re.search("^([^\t]*)\t([^\t]*)\t.*$", line)
-       res = re.search("^([^\t]*)\t([^\t\r\n]*)[\r\n]*$", line)
-       if res:
-          #outputFile.writelines(res.group(2)+"\t"+res.group(1)+"\n")
-          outputFile.writelines(res.group(1)+"\t"+res.group(2)+"\n")
-    outputFile.close()
-    
-    # empty word alignment folder
-    word_alignment_folder = os.path.join('data','PARALLEL17_words')
-    word_alignment_files = glob.glob(os.path.join(word_alignment_folder,'*'))
-    
-    for f in word_alignment_files:
-        print("Removing file " + f + " from word alignment folder")
-        os.remove(f)
-    
-    if firstTime:
-       # call align_words and save file if it is the first time the script is called on those files
-       subprocess.call("python -m aba.align_words")
-       copyfile(os.path.join(os.path.join('data','PARALLEL17_words'),filename), os.path.join(os.path.join('corpus','PARALLEL17_words'),filename))
-    else:
-       # load the file otherwise
-       copyfile(os.path.join(os.path.join('corpus','PARALLEL17_words'),filename), os.path.join(os.path.join('data','PARALLEL17_words'),filename))
-
-    # save number of Words
-    wordFile = open(os.path.join(os.path.join('data','PARALLEL17_words'),filename), "r", encoding="utf-8")
-    fileSize[filename] = 0
-    for line in wordFile:
-       fileSize[filename] += 1
-    wordFile.close()
-
-    # find rules
-    subprocess.call("python -m aba.analyze")
-
-    # save rules
-    ruleFile = open(os.path.join('data','dic_p17_labeled.tsv'),'r',encoding='utf-8')
-    for line in ruleFile:
-       bigRuleFile.writelines(filename + "\t" + line)
-    ruleFile.close()
-
-    src = os.path.join('data','dic_p17_labeled.tsv')
-
-    df = pd.read_table(
-		    src,
-        names = ['old',
-                 'new',
-                 'count',
-                 'chars_nb',
-                 'old_chars',
-                 'new_chars',
-                 'rules'])
-
-    i = 0
-    totalCount = 0
-    rules = {}
-    
-    for line in df["rules"]:
-        if line=="[]":
-            line = "règle inconnue"
-        if line in rules.keys():
-            rules[line] += df["count"][i]
-        else:
-            rules[line] = df["count"][i]
-        totalCount += df["count"][i]
-        i += 1
-        
-    ##print(rules)
-    
-    for r in rules.keys():
-        ##print(r)
-        ##print("a")
-        ruleInTexts = []
-        if r in ruleTable.keys():
-            ruleInTexts = ruleTable[r]
-            i = len(ruleInTexts)
-            while i < fileNb:
-                ruleInTexts.append(0)
-                i += 1    
-        else:
-            i = 0
-            while i < fileNb:
-                ruleInTexts.append(0)
-                i += 1    
-        ruleInTexts.append(rules[r])
-        ruleTable[r] = ruleInTexts
-    
-    ##print("Rules after text " + str(i) + ":")    
-    ##print(ruleTable)
-
-    fileNb += 1
-    ##print(ruleTable.keys())
-    ##print(str(fileNb)+ "=?" +str(len(ruleTable[list(ruleTable.keys())[0]])))
-
-
-fileNb = 0
-
-output = open("output-rule.tsv","w",encoding="utf-8")
-outputR = open("output-rule-r.txt","w",encoding="utf-8")
-
-output.writelines((";".join(list(ruleTable.keys()))).replace("'","")+"\n")
-matrix = ""
-i=0
-for f in files:
-    newLine = ""
-    for j in range(0, len(list(ruleTable.keys()))):
-        i += 1
-        if fileNb < len(ruleTable[list(ruleTable.keys())[j]]):
-           value = str(ruleTable[list(ruleTable.keys())[j]][fileNb]/fileSize[os.path.basename(f)]) 
-           
-        else:
-           value = "0"
-        newLine += value + ";"
-        if i==1:
-            matrix += value
-        else:
-            matrix += ","+value
-    fileNb += 1
-    output.writelines(newLine+"\n")
-    #print(fileSize[os.path.basename(f)])
-    
-    
-output.close()
-
-shorterFiles = []
-for f in files:
-   res = re.search("corpus.([^_]+_[^_]+)_.*",f)
-   if res:
-      shorterFiles.append(res.group(1))
-   else:
-      res = re.search("corpus.(.*).tsv",f)
-      if res: 
-         shorterFiles.append(res.group(1))
-
-outputR.writelines("https://rdrr.io/snippets/\n")
-outputR.writelines("library(FactoMineR)\n")
-outputR.writelines("library(factoextra)\n")
-outputR.writelines("tab <- matrix(c(" + matrix + "), ncol=" + str(len(list(ruleTable.keys()))) + ", byrow=TRUE)\n")
-outputR.writelines("colnames(tab) <- c('" + "','".join(list(ruleTable.keys())).replace("'","").replace(",","','") + "')\n")
-outputR.writelines("rownames(tab) <- c('" + "','".join(shorterFiles) +"')\n")
-outputR.writelines("\n")
-outputR.writelines("tab <- as.table(tab)\n")
-outputR.writelines("\n")
-outputR.writelines("class(tab) <- \"numeric\"\n")
-outputR.writelines("aX <- as.data.frame(tab)\n")
-outputR.writelines("\n")
-outputR.writelines("aX\n")
-outputR.writelines("res.pca = PCA(aX, scale.unit=TRUE, ncp=2, graph=T)\n")
-outputR.writelines("\n")
-outputR.writelines("ind <- get_pca_ind(res.pca)\n")
-outputR.writelines("ind$coord\n")
-outputR.writelines("var <- get_pca_var(res.pca)\n")
-outputR.writelines("var$coord")
-outputR.close()
\ No newline at end of file
+# (1e : normalisée ; 2e : originale ; si inverse, échanger les colonnes dans read_corpus_file)
+
+# lines of corpus files kept : two columns
+CORPUS_LINE = re.compile('^([^\t]*)\t([^\t\r\n]*)[\r\n]*$')
+
+
+def run():
+
+	parser = argparse.ArgumentParser()
+	parser.add_argument('-c', '--corpus_dir', type = str,
+		help = 'directory of the corpus .tsv files',
+		default = 'corpus')
+	parser.add_argument('-w', '--words_dir', type = str,
+		help = 'directory where word alignments of corpus files are saved',
+		default = os.path.join('corpus', 'PARALLEL17_words'))
+	parser.add_argument('-r', '--reuse_words', action = 'store_true',
+		help = 'load word alignments saved by a previous run instead of aligning files again')
+	parser.add_argument('-l', '--lab_dic_path', type = str,
+		help = 'labeled dictionary of all files',
+		default = 'dic_p17_labeled.tsv')
+	parser.add_argument('-o', '--output', type = str,
+		help = 'rule frequencies of each file',
+		default = 'output-rule.tsv')
+	parser.add_argument('--output_r', type = str,
+		help = 'R script of a PCA of the rule frequencies',
+		default = 'output-rule-r.txt')
+	parser.add_argument('-m', '--max_cells', type = int,
+		help = 'number of matrix cells above which lines are aligned in linear space',
+		default = MAX_CELLS)
+	parser.add_argument('-j', '--jobs', type = int,
+		help = 'number of worker processes, each processing a file',
+		default = 1)
+	args = parser.parse_args()
+
+	files = sorted(glob.glob(os.path.join(args.corpus_dir, '*.tsv')))
+
+	names = [os.path.basename(f) for f in files]
+	sizes = []
+	rule_counts = []
+	with open(args.lab_dic_path, 'w', encoding = 'utf8') as lab_dic:
+		for name, (size, rows) in zip(names, extract_rules(files, args.words_dir, args.reuse_words, args.max_cells, args.jobs)):
+			print(name)
+			# save rules
+			for row in rows:
+				lab_dic.write(name + '\t' + '\t'.join(map(str, row)) + '\n')
+			sizes.append(size)
+			rule_counts.append(count_rules(rows))
+
+	write_rule_matrix(rule_counts, sizes, args.output)
+	write_r_script(rule_counts, sizes, names, args.output_r)
+
+
+def extract_rules(files, words_dir = None, reuse_words = False, max_cells = MAX_CELLS, jobs = 1):
+	"""Yields (number of aligned words, labeled rows) of corpus files, in order
+
+	Files are processed in `jobs` worker processes.
+	See file_rules.
+	"""
+	if words_dir is not None and not os.path.exists(words_dir):
+		os.makedirs(words_dir)
+	process = partial(file_rules, words_dir = words_dir, reuse_words = reuse_words, max_cells = max_cells)
+	with multiprocessing.Pool(jobs) if jobs > 1 else nullcontext() as pool:
+		yield from (pool.imap(process, files) if pool is not None else map(process, files))
+
+
+def file_rules(file, words_dir = None, reuse_words = False, max_cells = MAX_CELLS):
+	"""Returns (number of aligned words, labeled rows) of a corpus file
+
+	Rows are the entries of its dictionary labeled like label_dic does,
+	(old, new, count, number of diffs, old chars, new chars, rules) for each diff.
+
+	:param words_dir: directory where word alignments are saved, None to not save them
+	:param reuse_words: load the word alignment saved in words_dir if any, instead of aligning the file
+	"""
+	words_file = os.path.join(words_dir, os.path.basename(file)) if words_dir is not None else None
+	if reuse_words and words_file is not None and os.path.exists(words_file):
+		with open(words_file, 'r', encoding = 'utf8') as f:
+			pairs = [tuple(line.rstrip('\n').split('\t')) for line in f]
+	else:
+		pairs = align_corpus_file(file, max_cells)
+		if words_file is not None:
+			lst_to_tsv(pairs, words_file)
+	# dictionary of the file, then its labels
+	counts = sorted(Counter((old, new) for old, new in pairs if old != new).items())
+	rows = []
+	for ((_, _), count), (old, new, (ndiffs, diffs)) in zip(counts, label_pairs(pair for pair, _ in counts)):
+		for old_chars, new_chars, rules in diffs:
+			rows.append((old, new, count, ndiffs, old_chars, new_chars, rules))
+	return len(pairs), rows
+
+
+def align_corpus_file(file, max_cells = MAX_CELLS):
+	"""Returns aligned word pairs of the lines of a corpus file"""
+	submat = init_submat_chars()
+	cache = score_cache(submat = submat, mode = 'words', vocab = Vocabulary())
+	pairs = []
+	with CorpusFile(file, save_index = False) as corpus_file:
+		for line in read_corpus_file(corpus_file):
+			pairs += align_line(line, submat, cache, max_cells)
+	return pairs
+
+
+def read_corpus_file(lines):
+	"""Yields 2-columns .tsv lines of corpus lines, lines of other formats being left out"""
+	for line in lines:
+		res = CORPUS_LINE.search(line)
+		if res:
+			yield res.group(1) + '\t' + res.group(2) + '\n'
+
+
+def count_rules(rows):
+	"""Returns {rules: number of words} of labeled rows, unknown rules being 'règle inconnue'"""
+	rules = {}
+	for row in rows:
+		key = str(row[6])
+		if key == '[]':
+			key = 'règle inconnue'
+		rules[key] = rules.get(key, 0) + row[2]
+	return rules
+
+
+def rule_names(rule_counts):
+	"""Returns the rules of rule counts of files, in order of appearance"""
+	return list({rule: None for rules in rule_counts for rule in rules})
+
+
+def write_rule_matrix(rule_counts, sizes, file):
+	"""Writes frequencies of rules (number of words of each rule / number of words) of files, one file by line"""
+	names = rule_names(rule_counts)
+	with open(file, 'w', encoding = 'utf8') as output:
+		output.write(';'.join(names).replace("'", '') + '\n')
+		for rules, size in zip(rule_counts, sizes):
+			output.write(''.join(f'{rules.get(rule, 0) / size};' for rule in names) + '\n')
+
+
+def write_r_script(rule_counts, sizes, files, file):
+	"""Writes a R script computing a PCA of the rule frequencies of files"""
+	names = rule_names(rule_counts)
+	matrix = ','.join(str(rules.get(rule, 0) / size) for rules, size in zip(rule_counts, sizes) for rule in names)
+	shorter_files = []
+	for f in files:
+		res = re.search('^([^_]+_[^_]+)_.*', f) or re.search('^(.*).tsv', f)
+		if res:
+			shorter_files.append(res.group(1))
+	with open(file, 'w', encoding = 'utf8') as output:
+		output.write('https://rdrr.io/snippets/\n')
+		output.write('library(FactoMineR)\n')
+		output.write('library(factoextra)\n')
+		output.write(f'tab <- matrix(c({matrix}), ncol={len(names)}, byrow=TRUE)\n')
+		output.write("colnames(tab) <- c('" + "','".join(names).replace("'", '').replace(',', "','") + "')\n")
+		output.write("rownames(tab) <- c('" + "','".join(shorter_files) + "')\n")
+		output.write('\n')
+		output.write('tab <- as.table(tab)\n')
+		output.write('\n')
+		output.write('class(tab) <- "numeric"\n')
+		output.write('aX <- as.data.frame(tab)\n')
+		output.write('\n')
+		output.write('aX\n')
+		output.write('res.pca = PCA(aX, scale.unit=TRUE, ncp=2, graph=T)\n')
+		output.write('\n')
+		output.write('ind <- get_pca_ind(res.pca)\n')
+		output.write('ind$coord\n')
+		output.write('var <- get_pca_var(res.pca)\n')
+		output.write('var$coord')
+
+
+if __name__ == '__main__':
+	run()
\ No newline at end of file
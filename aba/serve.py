@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+
+from .utils.modern import Modernizer
+from .utils.server import start_server, BATCH_SIZE, BATCH_DELAY
+
+def run():
+
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--host', type = str,
+		help = 'address to listen on',
+		default = '127.0.0.1')
+	parser.add_argument('-p', '--port', type = int,
+		help = 'TCP port to listen on (no TCP server with -u and no port)')
+	parser.add_argument('-u', '--socket', type = str,
+		help = 'Unix socket path to listen on')
+	parser.add_argument('-b', '--batch_size', type = int,
+		help = 'maximal number of sentences modernized at once',
+		default = BATCH_SIZE)
+	parser.add_argument('-d', '--batch_delay', type = float,
+		help = 'time waited for other requests to fill a batch (s)',
+		default = BATCH_DELAY)
+	args = parser.parse_args()
+
+	port = args.port
+	if port is None and args.socket is None:
+		port = 8080
+
+	# load dictionaries once
+	print('loading dictionaries')
+	modernizer = Modernizer.load()
+
+	asyncio.run(serve(modernizer, args.host, port, args.socket, args.batch_size, args.batch_delay))
+
+
+async def serve(modernizer, host, port, socket_path, batch_size, batch_delay):
+	servers = await start_server(modernizer, host, port, socket_path, batch_size, batch_delay)
+	if port is not None:
+		print(f'listening on http://{host}:{port}')
+	if socket_path is not None:
+		print(f'listening on {socket_path}')
+	await asyncio.gather(*[server.serve_forever() for server in servers])
+
+
+if __name__ == '__main__':
+	run()
\ No newline at end of file
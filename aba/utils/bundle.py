@@ -0,0 +1,145 @@
+# bundle.py
+
+import os
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+
+# compiled dictionaries : header, then string tables
+#   header : magic, version, then (count, position) of each table
+#   table : count + 1 offsets (uint32, native byte order) of strings in the data following them, then utf8 data
+MAGIC = b'ABAD'
+BUNDLE_VERSION = 1
+TABLES = ('modern', 'name', 'learn_old', 'learn_new')
+HEADER = struct.Struct('<4sI' + 'QQ' * len(TABLES))
+
+
+class StringTable:
+	"""Strings of a table of a mapped bundle, str(i) being the i-th string"""
+
+	def __init__(self, buffer, position, count):
+		self.count = count
+		self.offsets = buffer[position:position + 4 * (count+1)].cast('I')
+		self.data = buffer[position + 4 * (count+1):]
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, i):
+		# bytes of the i-th string, for bisect
+		return self.data[self.offsets[i]:self.offsets[i+1]].tobytes()
+
+	def str(self, i):
+		return self[i].decode('utf8')
+
+	def find(self, s):
+		"""Returns the index of s in a sorted table, -1 if absent"""
+		key = s.encode('utf8')
+		i = bisect_left(self, key)
+		if i < self.count and self[i] == key:
+			return i
+		return -1
+
+
+class MappedSet:
+	"""Set of strings, membership tested on the sorted table
+
+	Pickled as its source (file, index of the dictionary), so that
+	worker processes map the file again instead of copying it.
+	"""
+
+	def __init__(self, table, source = None):
+		self.table = table
+		self.source = source
+
+	def __reduce__(self):
+		return (mapped_dic, self.source)
+
+	def __len__(self):
+		return len(self.table)
+
+	def __contains__(self, s):
+		return self.table.find(s) >= 0
+
+
+class MappedDict:
+	"""Dict of strings, keys in a sorted table and values in a table of the same order
+
+	Pickled as its source, like MappedSet.
+	"""
+
+	def __init__(self, keys, values, source = None):
+		self.keys = keys
+		self.values = values
+		self.source = source
+
+	def __reduce__(self):
+		return (mapped_dic, self.source)
+
+	def __len__(self):
+		return len(self.keys)
+
+	def __contains__(self, s):
+		return self.keys.find(s) >= 0
+
+	def __getitem__(self, s):
+		i = self.keys.find(s)
+		if i < 0:
+			raise KeyError(s)
+		return self.values.str(i)
+
+	def get(self, s, default = None):
+		i = self.keys.find(s)
+		return self.values.str(i) if i >= 0 else default
+
+
+def build_bundle(file, modern_dic, learn_dic, name_dic):
+	"""Writes dictionaries (sets and dict of strings) to a bundle file"""
+	learn = sorted((old.encode('utf8'), new.encode('utf8')) for old, new in learn_dic.items())
+	tables = {
+		'modern': sorted(s.encode('utf8') for s in modern_dic),
+		'name': sorted(s.encode('utf8') for s in name_dic),
+		'learn_old': [old for old, _ in learn],
+		'learn_new': [new for _, new in learn],
+	}
+	with open(file, 'wb') as f:
+		f.write(bytes(HEADER.size))
+		positions = []
+		for name in TABLES:
+			strings = tables[name]
+			# align offsets on 4 bytes
+			f.write(bytes(-f.tell() % 4))
+			positions += [len(strings), f.tell()]
+			offsets = array('I', [0])
+			for s in strings:
+				offsets.append(offsets[-1] + len(s))
+			if offsets.itemsize != 4:
+				raise ValueError('bundle offsets must be 4 bytes long')
+			f.write(offsets.tobytes())
+			f.write(b''.join(strings))
+		f.seek(0)
+		f.write(HEADER.pack(MAGIC, BUNDLE_VERSION, *positions))
+
+
+def load_bundle(file):
+	"""Returns (modern_dic, learn_dic, name_dic) of a bundle file, mapped in memory
+
+	Pages are shared by all processes mapping the same file.
+	"""
+	with open(file, 'rb') as f:
+		buffer = memoryview(mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ))
+	magic, version, *positions = HEADER.unpack(buffer[:HEADER.size])
+	if magic != MAGIC or version != BUNDLE_VERSION:
+		raise ValueError(f'{file} : not a version {BUNDLE_VERSION} dictionary bundle, rebuild it with python -m aba.build_bundle')
+	tables = {name: StringTable(buffer, position, count)
+		for name, count, position in zip(TABLES, positions[0::2], positions[1::2])}
+	file = os.fspath(file)
+	return (MappedSet(tables['modern'], (file, 0)),
+		MappedDict(tables['learn_old'], tables['learn_new'], (file, 1)),
+		MappedSet(tables['name'], (file, 2)))
+
+
+def mapped_dic(file, index):
+	"""Returns dictionary `index` of load_bundle(file)"""
+	return load_bundle(file)[index]
\ No newline at end of file
@@ -0,0 +1,128 @@
+# corpus.py
+
+import os
+import mmap
+import random
+import struct
+from array import array
+
+# index of the lines of a corpus file, saved next to it (file + INDEX_SUFFIX)
+#   header : magic, version, size and modification time (ns) of the file, number of lines
+#   then number of lines + 1 offsets (uint64, native byte order) of the starts of lines
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'ABAI'
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct('<4sIQqQ')
+
+
+class CorpusFile:
+	"""Lines of a corpus file, read from a memory map at the offsets of an index
+
+	The index is read from the file saved next to the corpus file, and built
+	in one pass (then saved) when missing or older than the corpus file.
+	Lines are decoded when accessed, without their line end : corpus[i], corpus[i:j],
+	lines(start, stop) and sample(n) never read the whole file into a list.
+
+	:param path: corpus file (utf8)
+	:param save_index: save the index when built (kept in memory only if the directory is read-only)
+	"""
+
+	def __init__(self, path, save_index = True):
+		self.path = os.fspath(path)
+		self.index_path = self.path + INDEX_SUFFIX
+		with open(self.path, 'rb') as f:
+			stat = os.fstat(f.fileno())
+			# (mmap of an empty file is not possible)
+			self.buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) if stat.st_size else b''
+		self.offsets = self.read_index(stat)
+		if self.offsets is None:
+			self.offsets = index_lines(self.buffer)
+			if save_index:
+				self.write_index(stat)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def __len__(self):
+		return len(self.offsets) - 1
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return list(self.lines(*i.indices(len(self))[:2]))
+		if i < 0:
+			i += len(self)
+		if not 0 <= i < len(self):
+			raise IndexError(i)
+		return self.buffer[self.offsets[i]:self.offsets[i+1]].decode('utf8').rstrip('\r\n')
+
+	def __iter__(self):
+		return self.lines()
+
+	def lines(self, start = 0, stop = None):
+		"""Yields lines start to stop (excluded)"""
+		stop = len(self) if stop is None else min(stop, len(self))
+		for i in range(start, stop):
+			yield self[i]
+
+	def sample(self, n, start = 0, stop = None, seed = None):
+		"""Returns n lines drawn at random (without replacement) among lines start to stop, in file order"""
+		stop = len(self) if stop is None else min(stop, len(self))
+		indices = random.Random(seed).sample(range(start, stop), min(n, max(stop - start, 0)))
+		return [self[i] for i in sorted(indices)]
+
+	def fold(self, k, folds):
+		"""Returns (first, last) lines of the k-th of `folds` consecutive parts (k from 0)"""
+		return len(self) * k // folds, len(self) * (k+1) // folds
+
+	def read_index(self, stat):
+		"""Returns the saved offsets of lines, None if missing or outdated"""
+		try:
+			with open(self.index_path, 'rb') as f:
+				header = f.read(INDEX_HEADER.size)
+				if len(header) != INDEX_HEADER.size:
+					return None
+				magic, version, size, mtime, count = INDEX_HEADER.unpack(header)
+				if (magic, version, size, mtime) != (INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns):
+					return None
+				offsets = array('Q')
+				offsets.frombytes(f.read())
+		except (OSError, ValueError):
+			return None
+		return offsets if len(offsets) == count + 1 else None
+
+	def write_index(self, stat):
+		tmp_file = self.index_path + '.tmp'
+		try:
+			with open(tmp_file, 'wb') as f:
+				f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, stat.st_size, stat.st_mtime_ns, len(self)))
+				f.write(self.offsets.tobytes())
+			os.replace(tmp_file, self.index_path)
+		except OSError:
+			# read-only directory : index kept in memory
+			pass
+
+	def close(self):
+		if isinstance(self.buffer, mmap.mmap):
+			self.buffer.close()
+
+
+def index_lines(buffer):
+	"""Returns offsets of the starts of the lines of buffer, and of its end"""
+	offsets = array('Q', [0])
+	start = 0
+	while (start := buffer.find(b'\n', start) + 1) > 0:
+		offsets.append(start)
+	# last line without line end
+	if offsets[-1] != len(buffer):
+		offsets.append(len(buffer))
+	return offsets
+
+
+def read_pairs(lines):
+	"""Yields (old, new) of 2-columns .tsv lines"""
+	for line in lines:
+		(old, new) = line.rstrip().split('\t')
+		yield old, new
\ No newline at end of file
@@ -1,9 +1,98 @@
-from ASR_metrics import utils as metrics
+# evaluation.py
+
+import multiprocessing
+from bisect import bisect_left
+from more_itertools import chunked
+
+from .strings import levenshtein_many
+
+# upper bounds of the length buckets of evaluate() (chars of the reference)
+LENGTH_BUCKETS = (2, 4, 8, 16, 32, 64, 128)
+
+# number of pairs evaluated at once by a worker process
+EVALUATION_CHUNK_SIZE = 4096
+
 
 # evaluation
-def cacc(lst):
-	return 1 - sum(metrics.calculate_cer(mod, new) for (mod, new) in lst) / len(lst)
+def cacc(lst, jobs = 1):
+	return evaluate(lst, jobs = jobs)['cacc']
+
+def wacc(lst, jobs = 1):
+	return evaluate(lst, jobs = jobs)['wacc']
+
+
+def cer(mod, new):
+	"""Returns the char error rate of mod : edit distance to new, spaces ignored, divided by the length of mod"""
+	return error_rates([(mod, new)])[0][0]
+
+
+def wer(mod, new):
+	"""Returns the word error rate of mod : edit distance between words, divided by the number of words of mod"""
+	return error_rates([(mod, new)])[0][1]
+
+
+def error_rates(pairs):
+	"""Returns (cer, wer) of (mod, new) pairs, distances being computed by batches"""
+	res = [(0.0, 0.0) if mod == new and mod.strip() else None for (mod, new) in pairs]
+	todo = [i for i, r in enumerate(res) if r is None]
+	chars = [(pairs[i][0].replace(' ', ''), pairs[i][1].replace(' ', '')) for i in todo]
+	words = [(pairs[i][0].split(), pairs[i][1].split()) for i in todo]
+	# (empty mod : ZeroDivisionError)
+	for i, (mod_chars, _), (mod_words, _), c, w in zip(todo, chars, words, levenshtein_many(chars), levenshtein_many(words)):
+		res[i] = (c / len(mod_chars), w / len(mod_words))
+	return res
+
+
+def evaluate(lst, jobs = 1, files = None, buckets = LENGTH_BUCKETS):
+	"""Returns accuracies of (mod, new) pairs, and by file and length of new
+
+	The result is {'cacc': 1 - mean cer, 'wacc': 1 - mean wer, 'pairs': number of pairs,
+	'files': {file: accuracies of its pairs}, 'lengths': {bucket: accuracies of its pairs}},
+	buckets being named after the bounds of the number of chars of new ('3-4', '>128').
+
+	:param jobs: number of worker processes computing error rates
+	:param files: file of each pair, None for no breakdown by file
+	:param buckets: increasing upper bounds of length buckets
+	"""
+	lst = list(lst)
+	if jobs > 1:
+		with multiprocessing.Pool(jobs) as pool:
+			rates = [r for chunk in pool.imap(error_rates, chunked(lst, EVALUATION_CHUNK_SIZE)) for r in chunk]
+	else:
+		rates = error_rates(lst)
+
+	# sum error rates of each group (in order, like sum())
+	names = bucket_names(buckets)
+	total = [sum(c for c, _ in rates), sum(w for _, w in rates), len(rates)]
+	by_file = {}
+	by_length = {}
+	for i, ((_, new), (c, w)) in enumerate(zip(lst, rates)):
+		groups = [by_length.setdefault(names[bisect_left(buckets, len(new))], [0, 0, 0])]
+		if files is not None:
+			groups.append(by_file.setdefault(files[i], [0, 0, 0]))
+		for group in groups:
+			group[0] += c
+			group[1] += w
+			group[2] += 1
+
+	res = accuracies(total)
+	res['files'] = {file: accuracies(group) for file, group in by_file.items()}
+	res['lengths'] = {name: accuracies(by_length[name]) for name in names if name in by_length}
+	return res
+
+
+def accuracies(group):
+	cer_sum, wer_sum, n = group
+	return {'cacc': 1 - cer_sum / n, 'wacc': 1 - wer_sum / n, 'pairs': n}
+
+
+def bucket_names(buckets):
+	"""Returns names of the buckets of lengths, last one being above the last bound"""
+	lows = [0] + [bound + 1 for bound in buckets]
+	return [f'{low}-{bound}' for low, bound in zip(lows, buckets)] + [f'>{buckets[-1]}']
 
-def wacc(lst):
-	return 1 - sum(metrics.calculate_wer(mod, new) for (mod, new) in lst) / len(lst)
 
+def format_breakdown(groups):
+	"""Returns lines of the accuracies of groups (from evaluate)"""
+	return '\n'.join(f'{name}\tcacc = {res["cacc"] * 100:.2f}\twacc = {res["wacc"] * 100:.2f}\t({res["pairs"]} pairs)'
+		for name, res in groups.items())
\ No newline at end of file
@@ -0,0 +1,96 @@
+# memo.py
+
+import sqlite3
+import threading
+
+# default number of words kept in a memo
+MEMO_SIZE = 1 << 20
+
+# number of new words or hits buffered before being written
+FLUSH_SIZE = 4096
+
+
+class WordMemo:
+	"""Persistent memo of modernized words, in a sqlite file
+
+	Entries are valid for one fingerprint (of the dictionaries and rules version) :
+	the memo is emptied when opened with another one. Above `max_size` words,
+	least recently used words are evicted. New words and hits are buffered
+	and written by batches. A WordMemo can be shared between threads.
+	"""
+
+	def __init__(self, path, fingerprint, max_size = MEMO_SIZE):
+		self.max_size = max_size
+		self.lock = threading.Lock()
+		self.db = sqlite3.connect(path, check_same_thread = False)
+		self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+		self.db.execute('CREATE TABLE IF NOT EXISTS memo (word TEXT PRIMARY KEY, modern TEXT, used INTEGER)')
+		self.db.execute('CREATE INDEX IF NOT EXISTS memo_used ON memo (used)')
+		row = self.db.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+		if row is None or row[0] != fingerprint:
+			# other dictionaries or rules : entries are outdated
+			self.db.execute('DELETE FROM memo')
+			self.db.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (fingerprint,))
+		self.db.commit()
+		# write time of entries, for eviction
+		self.clock = (self.db.execute('SELECT MAX(used) FROM memo').fetchone()[0] or 0) + 1
+		self.new = {}
+		self.hits = set()
+
+	def __len__(self):
+		with self.lock:
+			self.flush_locked()
+			return self.db.execute('SELECT COUNT(*) FROM memo').fetchone()[0]
+
+	def get(self, word):
+		"""Returns the modernized form of word, None if unknown"""
+		with self.lock:
+			if word in self.new:
+				return self.new[word]
+			row = self.db.execute('SELECT modern FROM memo WHERE word = ?', (word,)).fetchone()
+			if row is None:
+				return None
+			self.hits.add(word)
+			if len(self.hits) >= FLUSH_SIZE:
+				self.flush_locked()
+			return row[0]
+
+	def put(self, word, modern):
+		with self.lock:
+			self.new[word] = modern
+			if len(self.new) >= FLUSH_SIZE:
+				self.flush_locked()
+
+	def flush(self):
+		"""Writes buffered words and hits, evicts least recently used words"""
+		with self.lock:
+			self.flush_locked()
+
+	def flush_locked(self):
+		if not self.new and not self.hits:
+			return
+		clock = self.clock
+		self.clock += 1
+		self.db.executemany('UPDATE memo SET used = ? WHERE word = ?', [(clock, word) for word in self.hits])
+		self.db.executemany('INSERT OR REPLACE INTO memo VALUES (?, ?, ?)',
+			[(word, modern, clock) for word, modern in self.new.items()])
+		self.new = {}
+		self.hits = set()
+		# evict
+		size = self.db.execute('SELECT COUNT(*) FROM memo').fetchone()[0]
+		if size > self.max_size:
+			self.db.execute('DELETE FROM memo WHERE word IN (SELECT word FROM memo ORDER BY used LIMIT ?)',
+				(size - self.max_size,))
+		self.db.commit()
+
+	def clear(self):
+		with self.lock:
+			self.new = {}
+			self.hits = set()
+			self.db.execute('DELETE FROM memo')
+			self.db.commit()
+
+	def close(self):
+		with self.lock:
+			self.flush_locked()
+			self.db.close()
\ No newline at end of file
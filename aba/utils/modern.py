@@ -1,65 +1,326 @@
 # modern.py
 
-from more_itertools import consume
-from .strings import init_submat_chars, align_chars
+import os
+import time
+import hashlib
+import multiprocessing
+from functools import lru_cache
+from itertools import chain
+from contextlib import nullcontext
+from more_itertools import chunked
+from .strings import init_submat_chars, align_chars, tokenize, BAND_MARGIN
+from .bundle import load_bundle
+from .vocab import GAP
+from .memo import WordMemo, MEMO_SIZE
 
 import re
 
+# default dictionaries
+MODERN_DIC_PATH = os.path.join('data', 'dic_morphalou.tsv')
+LEARN_DIC_PATH = os.path.join('data', 'dic_p17.tsv')
+NAME_DIC_PATH = os.path.join('data', 'dic_resources.txt')
+# default dictionaries compiled by python -m aba.build_bundle
+BUNDLE_PATH = os.path.join('data', 'dics.bundle')
 
-def label_dic(input_file, output_file):
+# number of modernized words kept in cache by a Modernizer
+WORD_CACHE_SIZE = 1 << 18
 
-	submat = init_submat_chars()
+# version of modernize() and apply_rules(), to increase when their results change
+# (persistent memos of older versions are then emptied)
+RULES_VERSION = 1
 
+# default persistent memo of char alignments, shared by analyze and modernize_corpus
+ALIGN_MEMO_PATH = os.path.join('data', 'alignments.sqlite')
+# number of pairs aligned at once by label_pairs
+LABEL_CHUNK_SIZE = 512
+
+# modernizer (and char substitution matrix) of worker processes
+worker = {}
+
+
+def label_dic(input_file, output_file, jobs = 1, memo = None, labeled = None):
+	"""Labels differences of the entries of a dictionary (old, new, count)
+
+	:param jobs: number of worker processes aligning entries
+	:param memo: persistent memo of char alignments (see alignment_memo), None for none
+	:param labeled: rows of pairs already labeled (see read_labeled_dic), which are not labeled again
+	"""
+	labeled = labeled or {}
 	# read entries from source dictionary
 	with open(f'{input_file}', 'r', encoding = 'utf8') as src:
-		lines = src.readlines()
+		entries = [line.rstrip('\n').split('\t') for line in src]
 	# process entries
 	with open(f'{output_file}', 'w', encoding = 'utf8') as dst:
-		# process dictionary entries
-		for line in lines:
-			# parse entry
-			old, new, count = line.rstrip('\n').split('\t')
-			# align chars
-			old, new = align_chars(old, new, submat = submat)
-			# find differences
-			ndiffs, diffs = find_diffs(old, new)
+		# process dictionary entries not labeled yet
+		labels = label_pairs(((old, new) for old, new, _ in entries if (old, new) not in labeled), jobs = jobs, memo = memo)
+		for old, new, count in entries:
+			if (old, new) in labeled:
+				for old_aligned, new_aligned, *row in labeled[old, new]:
+					dst.write('\t'.join([old_aligned, new_aligned, count, *row]) + '\n')
+				continue
+			old, new, (ndiffs, diffs) = next(labels)
 			# write new entry for each diff
 			for diff in diffs:
 				old_chars, new_chars, rules = diff
 				dst.write(f'{old}\t{new}\t{count}\t{ndiffs}\t{old_chars}\t{new_chars}\t{rules}\n')
 
 
-def preprocess(s):
-	# separate and unify apostrophes
-	s = re.sub(r"(['’])", r"’ ", s)
-	# separate punctuation
-	s = re.sub(r"([.,!?;:])", r" \1", s)
-	# separate tags
-	s = re.sub(r'(<.*>)', r' \1 ', s)
-	return s
-
-def postprocess(s):
-	# opening tag
-	s = re.sub(r'(<[^/].*>)', r' \1', s)
-	# closing tag
-	s = re.sub(r'(</.*>)', r'\1 ', s)
-	# spaces
-	s = re.sub(r' +', ' ', s)
-	# punctuation
-	s = re.sub(r"(['’]) ", r"'", s)
-	s = re.sub(r" ([.,])", r"\1", s)
-	return s
+def read_labeled_dic(labeled_file, dic_file):
+	"""Returns {(old, new): rows} of the entries of dic_file, rows being those written
+	for them by label_dic to labeled_file, without their count
+
+	Pairs of words including gaps are left out (their rows can't be told apart).
+	"""
+	with open(dic_file, 'r', encoding = 'utf8') as f:
+		pairs = [line.rstrip('\n').split('\t')[:2] for line in f]
+	labeled = {(old, new): [] for old, new in pairs if GAP not in old and GAP not in new}
+	with open(labeled_file, 'r', encoding = 'utf8') as f:
+		for line in f:
+			old, new, _, *row = line.rstrip('\n').split('\t')
+			rows = labeled.get((old.replace(GAP, ''), new.replace(GAP, '')))
+			if rows is not None:
+				rows.append((old, new, *row))
+	return labeled
+
+
+def label_pairs(pairs, jobs = 1, memo = None, chunk_size = LABEL_CHUNK_SIZE):
+	"""Yields (aligned old, aligned new, find_diffs() result) of (old, new) pairs, in order
+
+	Pairs are aligned by chunks, in worker processes when jobs > 1.
+	Alignments found in memo are not computed again, new ones are added to it.
+
+	:param memo: WordMemo of alignments, from alignment_memo()
+	"""
+	def lookup(chunk):
+		# alignments known by memo, None otherwise
+		for old, new in chunk:
+			aligned = memo.get(f'{old}\t{new}') if memo is not None else None
+			yield old, new, aligned and tuple(aligned.split('\t'))
+
+	chunks = (list(lookup(chunk)) for chunk in chunked(pairs, chunk_size))
+	with multiprocessing.Pool(jobs) if jobs > 1 else nullcontext() as pool:
+		results = pool.imap(label_chunk, chunks) if pool is not None else map(label_chunk, chunks)
+		for res in results:
+			for old, new, aligned, diffs in res:
+				if memo is not None:
+					memo.put(f'{old}\t{new}', '\t'.join(aligned))
+				yield (*aligned, diffs)
+
+
+def label_chunk(chunk):
+	"""Returns (old, new, alignment, diffs) of (old, new, alignment or None) entries"""
+	if 'submat' not in worker:
+		worker['submat'] = init_submat_chars()
+	res = []
+	for old, new, aligned in chunk:
+		if aligned is None:
+			aligned = align_chars(old, new, submat = worker['submat'])
+		res.append((old, new, aligned, find_diffs(*aligned)))
+	return res
+
+
+def alignment_memo(path, max_size = MEMO_SIZE):
+	"""Returns a persistent memo of char alignments, emptied when the substitution matrix changes"""
+	digest = hashlib.sha256(f'{BAND_MARGIN} {sorted(init_submat_chars().items())}'.encode('utf8'))
+	return WordMemo(path, digest.hexdigest(), max_size)
+
+
+class Modernizer:
+	"""Modernizes words and sentences with dictionaries loaded once
+
+	Words are modernized like modernize(), results of the last `cache_size`
+	distinct words being kept. Dictionaries are only read once loaded,
+	so a Modernizer can be shared between threads.
+
+	:param modern_dic: modern words (set)
+	:param learn_dic: modernized form of old words (dict)
+	:param name_dic: proper names (set)
+	:param rules: modernize words found in no dictionary with rules
+	:param max_candidates: maximal number of rule candidates tried per word, None for all
+	:param memo: persistent WordMemo, opened with the fingerprint of these dictionaries
+		(dictionary_fingerprint()), None for no persistent memo
+	"""
+
+	def __init__(self, modern_dic, learn_dic, name_dic = {}, rules = True, cache_size = WORD_CACHE_SIZE, memo = None,
+		max_candidates = None):
+		self.modern_dic = modern_dic
+		self.learn_dic = learn_dic
+		self.name_dic = name_dic
+		self.rules = rules
+		self.max_candidates = max_candidates
+		self.memo = memo
+		self.modernize_word = lru_cache(maxsize = cache_size)(self.modernize_word)
+
+	@classmethod
+	def from_files(cls, modern_dic_path = MODERN_DIC_PATH, learn_dic_path = LEARN_DIC_PATH,
+		name_dic_path = NAME_DIC_PATH, rules = True, memo = None, max_candidates = None):
+		"""Returns a Modernizer with dictionaries read from files"""
+		return cls(*read_dics(modern_dic_path, learn_dic_path, name_dic_path), rules = rules, memo = memo,
+			max_candidates = max_candidates)
+
+	@classmethod
+	def from_bundle(cls, bundle_path = BUNDLE_PATH, rules = True, memo = None, max_candidates = None):
+		"""Returns a Modernizer with dictionaries mapped from a compiled bundle"""
+		return cls(*load_bundle(bundle_path), rules = rules, memo = memo, max_candidates = max_candidates)
+
+	@classmethod
+	def load(cls, rules = True, memo = None, max_candidates = None):
+		"""Returns a Modernizer with the default dictionaries,
+		from their bundle when compiled after their last change
+		"""
+		sources = [path for path in (MODERN_DIC_PATH, LEARN_DIC_PATH, NAME_DIC_PATH) if os.path.exists(path)]
+		if (os.path.exists(BUNDLE_PATH)
+			and all(os.path.getmtime(path) <= os.path.getmtime(BUNDLE_PATH) for path in sources)):
+			return cls.from_bundle(rules = rules, memo = memo, max_candidates = max_candidates)
+		return cls.from_files(rules = rules, memo = memo, max_candidates = max_candidates)
+
+	def modernize_word(self, word):
+		mod = self.memo.get(word) if self.memo is not None else None
+		if mod is None:
+			mod = modernize(word, self.modern_dic, self.learn_dic, name_dic = self.name_dic, rules = self.rules,
+				max_candidates = self.max_candidates)
+			if self.memo is not None:
+				self.memo.put(word, mod)
+		return mod
+
+	def modernize_sentence(self, s):
+		tokens = tokenize(s, tags = True)
+		return rebuild_sentence(s, tokens, [self.modernize_word(token) for (token, _, _) in tokens])
+
+	def modernize_many(self, sentences):
+		"""Yields modernized sentences"""
+		for s in sentences:
+			yield self.modernize_sentence(s)
+
+	def modernize_words(self, words, jobs = 1):
+		"""Returns modernized forms of distinct words
+
+		:param jobs: number of worker processes modernizing words
+		"""
+		words = list(words)
+		if jobs <= 1:
+			return [self.modernize_word(word) for word in words]
+		# words of the persistent memo, others in worker processes
+		mods = {}
+		if self.memo is not None:
+			mods = {word: mod for word in words if (mod := self.memo.get(word)) is not None}
+		todo = [word for word in words if word not in mods]
+		initargs = (self.modern_dic, self.learn_dic, self.name_dic, self.rules, self.max_candidates)
+		with multiprocessing.Pool(jobs, initializer = init_modernize_worker, initargs = initargs) as pool:
+			for word, mod in zip(todo, pool.map(modernize_worker_word, todo, chunksize = max(1, len(todo) // (8 * jobs)))):
+				mods[word] = mod
+				if self.memo is not None:
+					self.memo.put(word, mod)
+		return [mods[word] for word in words]
+
+	def modernize_vocabulary_first(self, sentences, jobs = 1):
+		"""Returns modernized sentences and statistics of their vocabulary
+
+		Distinct words (types) are collected and modernized once each,
+		then sentences are rebuilt by lookup.
+		Statistics are the number of tokens and types, the type/token ratio,
+		the time spent modernizing types and an estimate of the time saved
+		(time that modernizing each token would have taken more).
+
+		:param jobs: number of worker processes modernizing types
+		"""
+		# collect types
+		tokens = [tokenize(s, tags = True) for s in sentences]
+		types = {token for sentence_tokens in tokens for (token, _, _) in sentence_tokens}
+		n_tokens = sum(len(sentence_tokens) for sentence_tokens in tokens)
+		# modernize types once
+		start = time.perf_counter()
+		types = list(types)
+		mods = dict(zip(types, self.modernize_words(types, jobs = jobs)))
+		seconds = time.perf_counter() - start
+		# rebuild sentences
+		res = [rebuild_sentence(s, sentence_tokens, [mods[token] for (token, _, _) in sentence_tokens])
+			for s, sentence_tokens in zip(sentences, tokens)]
+		stats = {
+			'tokens': n_tokens,
+			'types': len(types),
+			'ratio': len(types) / n_tokens if n_tokens else 0,
+			'seconds': seconds,
+			'saved': seconds / len(types) * (n_tokens - len(types)) if types else 0,
+		}
+		return res, stats
+
+
+def init_modernize_worker(modern_dic, learn_dic, name_dic, rules, max_candidates):
+	worker['modernizer'] = Modernizer(modern_dic, learn_dic, name_dic, rules = rules, max_candidates = max_candidates)
+
+
+def modernize_worker_word(word):
+	return worker['modernizer'].modernize_word(word)
+
+
+def rebuild_sentence(s, tokens, words):
+	"""Returns s with its tokens (from tokenize) replaced by words,
+	keeping original spacing and punctuation
+	"""
+	out = []
+	end = 0
+	for (_, start, stop), word in zip(tokens, words):
+		gap = s[end:start]
+		# glue word to previous apostrophe (l’ homme → l'homme)
+		if out and out[-1].endswith("'"):
+			gap = gap.lstrip(' ')
+		word = word.replace("’ ", "'")
+		if word.endswith("’"):
+			word = word[:-1] + "'"
+		out += [gap, word]
+		end = stop
+	out.append(s[end:])
+	return ''.join(out)
+
+
+def dictionary_fingerprint(paths = None, rules = True, max_candidates = None):
+	"""Returns a hash of the content of dictionary files, the rules version and rules parameters
+
+	:param paths: dictionary files, the default ones when None (or their bundle, if only it exists)
+	"""
+	if paths is None:
+		paths = [path for path in (MODERN_DIC_PATH, LEARN_DIC_PATH, NAME_DIC_PATH) if os.path.exists(path)] or [BUNDLE_PATH]
+	digest = hashlib.sha256(f'{RULES_VERSION} {rules} {max_candidates}'.encode('utf8'))
+	for path in paths:
+		with open(path, 'rb') as f:
+			for block in iter(lambda: f.read(1 << 20), b''):
+				digest.update(block)
+		digest.update(b'\0')
+	return digest.hexdigest()
+
+
+def read_dics(modern_dic_path = MODERN_DIC_PATH, learn_dic_path = LEARN_DIC_PATH, name_dic_path = NAME_DIC_PATH):
+	"""Returns (modern_dic, learn_dic, name_dic) read from files
+
+	:param learn_dic_path: .tsv file, old and modernized forms in the first two columns,
+		then optionally their count : the most frequent modernized form of an old form is kept
+	"""
+	modern_dic 	= {line.strip() for line in open(modern_dic_path, 'r', encoding = 'utf8')}
+	name_dic 	= {line.strip() for line in open(name_dic_path, 'r', encoding = 'utf8')}
+	learn_dic 	= best_variants(line.rstrip('\n').split('\t') for line in open(learn_dic_path, 'r', encoding = 'utf8'))
+	return modern_dic, learn_dic, name_dic
+
+
+def best_variants(rows):
+	"""Returns {old: new} of (old, new[, count]) rows, new being the most frequent variant of old
+	(the last one of equally frequent variants, rows without count counting once)
+	"""
+	learn_dic = {}
+	counts = {}
+	for (old, new, *rest) in rows:
+		count = int(rest[0]) if rest and rest[0].isdigit() else 1
+		if count >= counts.get(old, 0):
+			learn_dic[old] = new
+			counts[old] = count
+	return learn_dic
+
 
 def modernize_sentence(s, modern_dic, learn_dic, name_dic = {}):
-	s = preprocess(s)
-	tokens_old = s.replace("'", "’").replace("’", "’ ").split(' ')
-	tokens_new = [modernize(token, modern_dic, learn_dic, name_dic = name_dic) for token in tokens_old]
-	s = ' '.join(tokens_new)
-	s = postprocess(s)
-	return s
+	return Modernizer(modern_dic, learn_dic, name_dic).modernize_sentence(s)
 
 
-def modernize(word, modern_dic, learning_dic, name_dic = {}, rules = True):
+def modernize(word, modern_dic, learning_dic, name_dic = {}, rules = True, max_candidates = None):
 	# word present in modern dic : keep
 	if (word and word[0].isupper() and word.replace("’", "'") in name_dic) or word.lower().replace("’", "'") in modern_dic:
 		pass
@@ -68,20 +329,23 @@ def modernize(word, modern_dic, learning_dic, name_dic = {}, rules = True):
 		word = learning_dic[word]
 	# word absent in both dics : apply rules
 	elif rules:
-		mods = apply_rules(word)
-		# check all modernizations
-		# keep the one that appears in modern dic
-		word = mods[0]
-		for m in mods:
+		mods = apply_rules(word, max_candidates)
+		# check modernizations until one appears in modern dic
+		# (first one otherwise)
+		word = first = next(mods, word)
+		for m in chain([first], mods):
 			if (m and m[0].isupper() and m.replace("’", "'") in name_dic) or m.lower().replace("’", "'") in modern_dic:
 				word = m
 				break
-		# store result
 	return word
 
 
 def find_diffs(old, new):
+	"""Returns (number of diffs, diffs) between aligned old and new words
 
+	Each differing position is labeled by the first rule of DIFF_RULES matching it,
+	a diff being (old chars, new chars, [label]) ([] if no rule matches).
+	"""
 	assert len(old) == len(new), 'error : words not aligned'
 
 	diffs = []
@@ -90,511 +354,367 @@ def find_diffs(old, new):
 	old = old.lower()
 	new = new.lower()
 
-	indexes = iter(range(len(old)))
-
-	for i in indexes:
-
+	i = 0
+	while i < len(old):
 		if old[i] != new[i]:
-			# Test : 
-			#if (old[i:i+2] == "ei" and new[i:i+2] == "¤i"):
-			#	print(old + "-" + new)
-				
-				# variations purement morphologiques / régularisation du pluriel des thèmes en t : forests -> fore¤¤z (final)
-				# P12a+
-				
-				
-      
-			if (old[i] == new[i].upper() or
-				new[i] == old[i].upper()):
+			upper, rules = pair_rules(old[i], new[i])
+			if upper:
 				diffs.append((old[i], new[i], ['majuscule']))
-				# Syntaxique
-			if (old[i] == 'ſ' and new[i] in 'sz'):
-				diffs.append((old[i], new[i], ['s long']))
-				# Alphabet
-				# P2
-
-			# ocr errors
-			elif (old[i] in 'lf' and new[i] in 's'
-			 or old[i] in 'ſ' and new[i] in 'lf'
-			 or old[i] in 'r' and new[i] in 't'
-			 or old[i] in 'n' and new[i] in 'r'
-			 or old[i] in 'i' and new[i] in 'l'
-			 or old[i] == 'u' and new[i] == 'n'
-			 or old[i] == 'l' and new[i] in 'ij'):
-				diffs.append((old[i], new[i], ['erreur OCR']))
-				# Anecdotique
-
-			elif (old[i-3:i+1] == 'oing' and new[i-3:i+1] == 'oin¤'):
-				diffs.append((old[i-3:i+1], new[i-3:i+1], ['oing → oin']))
-				# P10
-				# Consonnes muettes internes (ou pas, en fait) : diacritique ou étymologique (mais on ne sait pas différencier) 
-				# diacritique qui indique la prononciation du n : beſoing -> besoin
-				# ou étymologique : loing -> loin, loingtaine -> lointaine
-
-			elif (old[i:i+3] == 'ain' and new[i:i+3] == 'ein'):
-				diffs.append((old[i:i+3], new[i:i+3], ['ain ↔ ein']))
-				# P8
-				# voyelles nasales e tildé
-				consume(indexes, 2)
-
-			# eoi → oi
-			elif (old[i:i+3] == 'eoi' and new[i:i+3] == '¤oi'):
-				diffs.append((old[i:i+3], new[i:i+3], ['eoi → oi']))
-				consume(indexes, 2)
-				# voyelles / diphtongues et hiatus / ancien hiatus eoi
-				# P6b+
-
-			# ein → in
-			elif (old[i:i+3] == 'ein' and new[i:i+3] == '¤in'):
-				diffs.append((old[i:i+3], new[i:i+3], ['ein → in']))
-				consume(indexes, 2)
-				# P8
-				# voyelles nasales e tildé
-
-			# eil → il
-			elif (old[i:i+3] == 'eil' and new[i:i+3] == '¤il'):
-				diffs.append((old[i:i+3], new[i:i+3], ['eil → il']))
-				consume(indexes, 2)
-				# (vermeillon -> verm¤illon) : eil -> ¤il ou ei -> ¤i (pas d'autre occurrence à part veit -> v¤it) ?
-				# voyelles / diphtongues et hiatus / ancien hiatus -> hiatus par analogie et pas historique
-				# P6b+
-				
-			# nn → mn
-			elif (old[i:i+2] == 'nn' and new[i:i+2] == 'mn'):
-				diffs.append((old[i:i+2], new[i:i+2], ['nn → mn']))
-				consume(indexes, 1)
-				# consonnes doubles / consonnes doubles phonogrammiques + (historique) ?
-				# P9 historiques
-
-			# mt/nt → mpt
-			elif (old[i:i+3] in ['n¤t','¤nt'] and new[i:i+3] == 'mpt'):
-				diffs.append((old[i:i+3], new[i:i+3], ['mt/nt → mpt']))
-				consume(indexes, 2)
-			elif (old[i-1:i+2] == 'm¤t' and new[i-1:i+2] == 'mpt'):
-				# Question Jonathan : pourquoi pas elif (old[i:i+3] in ['m¤t','¤mt'] and new[i:i+3] == 'mpt'):
-				diffs.append((old[i-1:i+2], new[i-1:i+2], ['mt/nt → mpt']))
-				consume(indexes, 1)
-				# consonnes muettes internes, consonnes étymologiques ++
-				# P10
-
-			# ept → et / ipt → it / opc → oc
-			elif (old[i-1:i+2] == 'ept' and new[i-1:i+2] == 'e¤t'
-			   or old[i-1:i+2] == 'ipt' and new[i-1:i+2] == 'i¤t'
-			   or old[i-1:i+2] == 'opc' and new[i-1:i+2] == 'o¤c'):
-				diffs.append((old[i-1:i+2], new[i-1:i+2], ['suppression lettre étymologique']))
-				# consonnes muettes internes, consonnes étymologiques ++
-				# P10
-
-			# latin eus/us → e
-			elif (old[i:i+3] == 'eus' and new[i:i+3] == 'e¤¤'):
-				diffs.append((old[i:i+3], new[i:i+3], ['terminaison latine us → e']))
-				# PAS TROUVE DANS CORPUS
-				consume(indexes, 2)
-			elif (old[i:i+2] == 'us' and new[i:i+2] in ['e¤','¤e']):
-				diffs.append((old[i:i+2], new[i:i+2], ['terminaison latine us → e']))
-				consume(indexes, 1)
-				# latinisme
-
-			# au → eau
-			elif (old[i:i+3] == '¤au' and new[i:i+3] == 'eau'):
-				diffs.append((old[i:i+3], new[i:i+3], ['au → eau']))
-				consume(indexes, 2)
-				# co¤teaux -> coteaux
-				# P6a+
-
-			# cque/que → c (avecques, avecque, aveque)
-			elif (i-1 > 0 and old[i-1] == new[i-1] == 'c'
-				and (old[i:i+4] == 'ques' and new[i:i+4] == '¤¤¤¤')
-				or (old[i:i+3] == 'que' and new[i:i+3] == '¤¤¤')):
-				diffs.append((old[i:i+4], new[i:i+4], ['cque/que → c']))
-				consume(indexes, 3)
-				# consonnes muettes internes, consonnes étymologiques ++
-				# P10+
-
-			elif (old[i:i+3] == 'que' and new[i:i+3] == 'c¤¤'):
-				diffs.append((old[i:i+3], new[i:i+3], ['cque/que → c']))
-				consume(indexes, 2)
-				# consonnes muettes internes, consonnes étymologiques ++
-				# P10+
-
-			elif (i-1 > 0 and old[i-1] == new[i-1] == 'c'
-				and old[i:i+3] == 'que' and new[i:i+3] == '¤¤¤'):
-				diffs.append((old[i:i+3], new[i:i+3], ['cque/que → c']))
-				consume(indexes, 2)
-				# aueque -> avec¤¤, donques -> donc¤¤¤, vainquera-vainc¤¤ra
-
-			# séparation
-			elif (old[i:i+2] == '¤¤' and new[i:i+2] in ["' ", "’ "]):
-				diffs.append((old[i:i+2], new[i:i+2], ['séparation avec apostrophe']))
-				consume(indexes, 1)
-				# segmentation - désagglutination
-				
-
-			elif (old[i:i+2] in ['œ¤','¤œ'] and new[i:i+2] == 'oe'
-			   or old[i:i+2] == 'oe' and new[i:i+2] in ['œ¤','¤œ']):
-				diffs.append((old[i:i+2], new[i:i+2], ['œ ↔ oe']))
-				consume(indexes, 1)
-				# Alphabet -> ligature
-
-			elif (old[i:i+2] in ["' ", "’ "] and new[i:i+2] == '¤¤'):
-				diffs.append((old[i:i+2], new[i:i+2], ['contraction']))
-				consume(indexes, 1)
-				# segmentation - agglutination
-
-			elif (old[i:i+2] in ['ai','ei'] and new[i:i+2] in ['è¤','¤è', 'e¤','¤e']):
-				diffs.append((old[i:i+2], new[i:i+2], ['ai/ei → e/è']))
-				consume(indexes, 1)
-				# P4c+ timbre de E 
-				# voyelles orales : alternance ai/ei vs è¤ ¤è e¤ ¤e
-
-			elif (old[i:i+2] == 'an' and new[i:i+2] == 'en'
-			   or old[i:i+2] == 'en' and new[i:i+2] == 'an'
-			   or old[i:i+2] == 'am' and new[i:i+2] == 'em'
-			   or old[i:i+2] == 'em' and new[i:i+2] == 'am'):
-				diffs.append((old[i:i+2], new[i:i+2], ['an/am ↔ en/em']))
-				consume(indexes, 1)
-				# P8
-				# voyelles nasales a tildé
-
-			elif (old[i:i+2] == 'gd' and new[i:i+2] == '¤d'):
-				diffs.append((old[i:i+2], new[i:i+2], ['gd → d']))
-				consume(indexes, 1)
-				# P10
-				# consonnes muettes internes étymologiques magdeleine / magdelene +
-
-			elif (old[i:i+2] == 'ct' and new[i:i+2] == '¤t'):
-				diffs.append((old[i:i+2], new[i:i+2], ['ct → t']))
-				consume(indexes, 1)
-				# P10
-				# consonnes muettes internes étymologiques
-
-			elif (old[i:i+2] == 'nt' and new[i:i+2] == 'mt'):
-				diffs.append((old[i:i+2], new[i:i+2], ['nt → mt']))
-				consume(indexes, 1)
-				# ex : conte -> comte, viconte -> cicomte, contesse -> comtesse
-				# P10
-				# consonnes muettes internes étymologiques + 
-				print(old + "-" + new)
-
-			elif (old[i:i+2] == 'qu' and new[i:i+2] in ['¤c', 'c¤']
-			   or old[i:i+2] in ['¤c', 'c¤'] and new[i:i+2] == 'qu'):
-				diffs.append((old[i:i+2], new[i:i+2], ['qu ↔ c']))
-				consume(indexes, 1)
-
-			elif (old[i:i+2] in ['¤f', 'f¤'] and new[i:i+2] == 'ph'):
-				diffs.append((old[i:i+2], new[i:i+2], ['f → ph']))
-				consume(indexes, 1)
-
-			# as → â
-			elif (old[i:i+2] in ['aſ','as'] and new[i:i+2] == 'â¤'):
-				diffs.append((old[i:i+2], new[i:i+2], ['as → â']))
-				consume(indexes, 1)
-
-			# es → é
-			elif (old[i:i+2] in ['eſ','es'] and new[i:i+2] == 'é¤'):
-				diffs.append((old[i:i+2], new[i:i+2], ['es → é']))
-				consume(indexes, 1)
-
-			# double consonne avec s long
-			elif (old[i:i+2] in ['ſ¤','¤ſ'] and new[i:i+2] == 'ss'):
-				diffs.append((old[i:i+2], new[i:i+2], ['double consonne']))
-				consume(indexes, 1)
-
-			elif (old[i-1:i+1] in ['ul', 'il'] and new[i-1:i+1] in ['i¤', 'u¤']):
-				diffs.append((old[i-1:i+1], new[i-1:i+1], ['suppression l après voyelle']))
-
-			elif (old[i:i+2] == 'ph' and new[i:i+2] in ['¤f', 'f¤']):
-				diffs.append((old[i:i+2], new[i:i+2], ['ph → f']))
-				consume(indexes, 1)
-
-			elif (old[i:i+2] in ['¤o', 'o¤'] and new[i:i+2] == 'au'
-			   or old[i:i+2] == 'au' and new[i:i+2] in ['¤o', 'o¤']):
-				diffs.append((old[i:i+2], new[i:i+2], ['o ↔ au']))
-				consume(indexes, 1)
-
-			elif (old[i:i+2] in ['&¤','¤&'] and
-				  new[i:i+2] == 'et'):
-				diffs.append((old[i:i+2], new[i:i+2], ['esperluette']))
-				consume(indexes, 1)
-			elif (old[i:i+2] in ['ß¤','¤ß'] and
-				  new[i:i+2] == 'ss'):
-				diffs.append((old[i:i+2], new[i:i+2], ['eszett']))
-				# P2 
-				# Alphabet
-				consume(indexes, 1)
-			elif (old[i:i+2] in ['eu','eû', 'ev', 'eü'] and
-				  new[i:i+2] in ['¤u', '¤û']):
-				diffs.append((old[i:i+2], new[i:i+2], ['eu → u']))
-				consume(indexes, 1)
-			elif (old[i:i+2] == 'y¤' and
-				  new[i:i+2] == 'is'):
-				diffs.append((old[i:i+2], new[i:i+2], ['terminaison y → is']))
-				consume(indexes, 1)
-			elif (old[i:i+2] == 'lt' and
-				  new[i:i+2] == '¤t'):
-				diffs.append((old[i:i+2], new[i:i+2], ['voyelle + lt → voyelle + t']))
-				consume(indexes, 1)
-			elif (old[i:i+2] == 'gn' and
-				  new[i:i+2] == 'nn'):
-				diffs.append((old[i:i+2], new[i:i+2], ['gn → nn']))
-				consume(indexes, 1)
-			elif (old[i:i+2] == 'es' and
-				  new[i:i+2] in ["¤'", "¤’", "'¤", "’¤"]):
-				diffs.append((old[i:i+2], new[i:i+2], ['élision es → apostrophe']))
-				consume(indexes, 1)
-
-			# tilde
-			elif (old[i:i+2] in ['ã¤','¤ã'] and new[i:i+2] in ['am','an']
-			   or old[i:i+2] in ['ẽ¤','¤ẽ'] and new[i:i+2] in ['em','en']
-			   or old[i:i+2] in ['õ¤','¤õ','ō¤','¤ō'] and new[i:i+2] in ['om','on']
-			   or old[i:i+2] in ['ũ¤','¤ũ'] and new[i:i+2] in ['um','un']):
-				diffs.append((old[i:i+2], new[i:i+2], ['tilde → voyelle + m/n']))
-				consume(indexes, 1)
-			elif (old[i:i+2] in ['sc', 'sç', 'ſc', 'ſç'] and new[i:i+2] == 's¤'):
-				diffs.append((old[i:i+2], new[i:i+2], ['sc → s']))
-				consume(indexes, 1)
-
-			# double consonne
-			elif (i+1 < len(old) and
-				 (old[i] == '¤' and old[i+1] == new[i] and new[i] == new[i+1]
-				or new[i] == '¤' and new[i+1] == old[i] and old[i] == old[i+1])):
-				diffs.append((old[i:i+2], new[i:i+2], ['double consonne']))
-				consume(indexes, 1)
-			elif (i-1 > 0 and 
-				(old[i] == '¤' and old[i-1] == new[i] and new[i] == new[i-1]
-				or new[i] == '¤' and new[i-1] == old[i] and old[i] == old[i-1])):
-				diffs.append((old[i:i+2], new[i:i+2], ['double consonne']))
-			
-			elif ((old[i], new[i]) == ('c', 'ç') or
-				  (old[i], new[i]) == ('ç', 'c')):
-				diffs.append((old[i], new[i], ['cédille']))
-			elif (old[i] == 'y' and
-				  new[i] in ['i', 'ï']):
-				if (i == len(old)-1):
-				   diffs.append((old[i], new[i], ['lettre calligraphique']))
-				else:
-				   diffs.append((old[i], new[i], ['transformation interne y  → i/ï']))
-			elif (old[i] in ['i', 'ï'] and
-				  new[i] == 'y'):
-				diffs.append((old[i], new[i], ['i → y']))
-			elif (old[i] in ['x', 'z'] and
-				  new[i] == 's'):
-				diffs.append((old[i], new[i], ['x/z → s']))
-			elif (old[i] == 'c' and
-				  new[i] == 's'):
-				diffs.append((old[i], new[i], ['c → s']))
-			elif (old[i] in 'sſ' and
-				  new[i] == 'z'):
-				diffs.append((old[i], new[i], ['s → z']))
-				# si és -> ez final ou es -> ez final: consonne muette finale / consonne diacritique (ex : eſtimés-estimez, laiſſes-laissez)
-				# P12b
-			elif (old[i] in 'sſ' and
-				  new[i] == 't'):
-				diffs.append((old[i], new[i], ['s → t']))
-			elif (old[i] in 'sſ' and
-				  new[i] == 'c'):
-				diffs.append((old[i], new[i], ['s → c']))
-			elif (old[i] == 'd' and
-				  new[i] == 't'):
-				diffs.append((old[i], new[i], ['d → t']))
-			elif (old[i] == 't' and
-				  new[i] == 'd'):
-				diffs.append((old[i], new[i], ['t → d']))
-			elif (old[i] == 'o' and
-				  new[i] == 'a'):
-				if ((i+2 == len(old)-1 and i+2 == len(new)-1 and old[i+1] == new[i+1] and old[i+1] == "i" and old[i+2] == new[i+2] and old[i+2] == "t") or
-				   (i+2 == len(old)-1 and i+2 == len(new)-1 and old[i+1] == new[i+1] and old[i+1] == "i" and old[i+2] == new[i+2] and old[i+2] == "s") or 
-				   (i+4 == len(old)-1 and i+4 == len(new)-1 and old[i+1] == new[i+1] and old[i+1] == "i" and old[i+2] == new[i+2] and old[i+2] == "e" and old[i+3] == new[i+3] and old[i+3] == "n" and old[i+4] == new[i+4] and old[i+4] == "t")):
-				    diffs.append((old[i], new[i], ['o → a imparfait/conditionnel']))
-				else:
-				    diffs.append((old[i], new[i], ['o → a sauf imparfait/conditionnel']))
-			elif (old[i] in "'’" and new[i] == 'e'):
-				diffs.append((old[i], new[i], ['apostrophe → e']))
-
-			# o → œ
-			elif (old[i] == 'o' and new[i] == 'œ'):
-				diffs.append((old[i], new[i], ['o → œ']))
-
-			# æ/œ
-			elif (old[i] == 'æ' and new[i] in 'eé'):
-				diffs.append((old[i], new[i], ['æ → e']))
-			elif (old[i] == 'œ' and new[i] in 'eé'):
-				diffs.append((old[i], new[i], ['œ → e']))
-			
-			elif (old[i] == '¤' and
-				  new[i] == 'h'):
-				diffs.append((old[i], new[i], ['ajout h mot grec']))
-			elif (old[i].lower() == 'e' and new[i].lower() == 'é'):
-				diffs.append((old[i], new[i], ['ajout accent aigu']))
-			elif (old[i].lower() == 'a' and new[i].lower() == 'à'
-				or old[i].lower() == 'e' and new[i].lower() == 'è'
-				or old[i].lower() == 'i' and new[i].lower() == 'ì'
-				or old[i].lower() == 'o' and new[i].lower() == 'ò'
-				or old[i].lower() == 'u' and new[i].lower() == 'ù'):
-				diffs.append((old[i], new[i], ['ajout accent grave']))
-			elif (old[i].lower() == 'a' and new[i].lower() == 'â'
-				or old[i].lower() == 'e' and new[i].lower() == 'ê'
-				or old[i].lower() == 'i' and new[i].lower() == 'î'
-				or old[i].lower() == 'o' and new[i].lower() == 'ô'
-				or old[i].lower() == 'u' and new[i].lower() == 'û'):
-				diffs.append((old[i], new[i], ['ajout accent circonflexe']))
-			elif (old[i].lower() == 'a' and new[i].lower() == 'ä'
-				or old[i].lower() == 'e' and new[i].lower() == 'ë'
-				or old[i].lower() == 'i' and new[i].lower() == 'ï'
-				or old[i].lower() == 'o' and new[i].lower() == 'ö'
-				or old[i].lower() == 'u' and new[i].lower() == 'ü'):
-				diffs.append((old[i], new[i], ['ajout tréma']))
-			elif (old[i].lower() == 'é' and new[i].lower() == 'e'):
-				diffs.append((old[i], new[i], ['retrait accent aigu']))
-			elif (old[i].lower() == 'à' and new[i].lower() == 'a'
-				or old[i].lower() == 'è' and new[i].lower() == 'e'
-				or old[i].lower() == 'ì' and new[i].lower() == 'i'
-				or old[i].lower() == 'ò' and new[i].lower() == 'o'
-				or old[i].lower() == 'ù' and new[i].lower() == 'u'):
-				diffs.append((old[i], new[i], ['retrait accent grave']))
-			elif (old[i].lower() == 'â' and new[i].lower() == 'a'
-				or old[i].lower() == 'ê' and new[i].lower() == 'e'
-				or old[i].lower() == 'î' and new[i].lower() == 'i'
-				or old[i].lower() == 'ô' and new[i].lower() == 'o'
-				or old[i].lower() == 'û' and new[i].lower() == 'u'):
-				diffs.append((old[i], new[i], ['retrait accent circonflexe']))
-			elif (old[i].lower() == 'ä' and new[i].lower() == 'a'
-				or old[i].lower() == 'ë' and new[i].lower() == 'e'
-				or old[i].lower() == 'ï' and new[i].lower() == 'i'
-				or old[i].lower() == 'ö' and new[i].lower() == 'o'
-				or old[i].lower() == 'ü' and new[i].lower() == 'u'):
-				diffs.append((old[i], new[i], ['retrait tréma']))
-			elif (old[i].lower() in 'äàâ' and new[i].lower() in 'äàâ'
-				or old[i].lower() in 'ëèê' and new[i].lower() in 'ëèê'
-				or old[i].lower() in 'ïìî' and new[i].lower() in 'ïìî'
-				or old[i].lower() in 'öòô' and new[i].lower() in 'öòô'
-				or old[i].lower() in 'üùû' and new[i].lower() in 'üùû'):
-				diffs.append((old[i], new[i], ['changement accent']))
-			elif (old[i] in ["'", "’"] and
-				  new[i] in ["'", "’"]):
-				diffs.append((old[i], new[i], ['apostrophe']))
-			elif (old[i] in [' ', '-'] and
-				  new[i] in ['-', '¤']):
-				diffs.append((old[i], new[i], ['fusion']))
-			elif (old[i] in ['¤', '-'] and
-				  new[i] in ['-', ' ']):
-				diffs.append((old[i], new[i], ['séparation']))
-			elif (old[i] == '¤' and
-				  new[i] in ['d', 't']):
-				diffs.append((old[i], new[i], ['ajout d/t terminaison']))
-			elif (old[i] in 'uv' and new[i] in 'uv' or
-				  old[i] in 'ij' and new[i] in 'ij'):
-				diffs.append((old[i], new[i], ['lettre ramiste']))
-			elif (old[i] in 'ſshtdcçb' and new[i] == '¤'):
-				diffs.append((old[i], new[i], ['suppression lettre étymologique']))
-			# no rule found
+			for match, start, size, label, skip in rules:
+				if match is None or match(old, new, i):
+					if not isinstance(label, str):
+						label = label(old, new, i)
+					diffs.append((old[i+start:i+start+size], new[i+start:i+start+size], [label]))
+					i += skip
+					break
 			else:
-				#print("Old:"+old[i])
-				#print("New:"+new[i])
 				diffs.append((old[i], new[i], []))
+		i += 1
 
 	return len(diffs), diffs
 
 
-def apply_rules(s):
-
-	mods = []
-
-	# s long
-	s = s.replace('ſ','s')
-	# eszett
-	s = s.replace('ß','ss')
-	# esperluette
-	s = s.replace('&','et')
+# rules of find_diffs, by priority, as (pair, match, start, size, label, skip) :
+#   pair(o, n) tells if the rule may apply to a position where o and n are aligned,
+#   match(old, new, i) if it applies to position i (always if None),
+#   the diff is old[i+start:i+start+size] → new[i+start:i+start+size],
+#   labeled label (or label(old, new, i)), and the next `skip` positions are skipped
+
+def window_rule(label, start, alternatives, skip = 0):
+	"""Rule of aligned patterns, alternatives being lists of (old patterns, new patterns)
+
+	Patterns cover positions i+start to i+start+len(pattern) of aligned words.
+	"""
+	size = len(alternatives[0][0][0])
+	chars = [({p[-start] for p in olds}, {p[-start] for p in news}) for olds, news in alternatives]
+
+	def pair(o, n):
+		return any(o in olds and n in news for olds, news in chars)
+
+	def match(old, new, i):
+		o = old[i+start:i+start+size]
+		n = new[i+start:i+start+size]
+		return any(o in olds and n in news for olds, news in alternatives)
+
+	return pair, (None if size == 1 else match), start, size, label, skip
+
+
+def char_rule(label, pair):
+	"""Rule on aligned chars only"""
+	return pair, None, 0, 1, label, 0
+
+
+def y_label(old, new, i):
+	if i == len(old)-1:
+		return 'lettre calligraphique'
+	return 'transformation interne y  → i/ï'
+
+
+def o_label(old, new, i):
+	if ((i+2 == len(old)-1 and i+2 == len(new)-1 and old[i+1] == new[i+1] and old[i+1] == "i" and old[i+2] == new[i+2] and old[i+2] == "t") or
+		(i+2 == len(old)-1 and i+2 == len(new)-1 and old[i+1] == new[i+1] and old[i+1] == "i" and old[i+2] == new[i+2] and old[i+2] == "s") or
+		(i+4 == len(old)-1 and i+4 == len(new)-1 and old[i+1] == new[i+1] and old[i+1] == "i" and old[i+2] == new[i+2] and old[i+2] == "e" and old[i+3] == new[i+3] and old[i+3] == "n" and old[i+4] == new[i+4] and old[i+4] == "t")):
+		return 'o → a imparfait/conditionnel'
+	return 'o → a sauf imparfait/conditionnel'
+
+
+def accent_rule(label, pairs):
+	"""Rule on aligned chars, pairs being (old chars, new chars) compared lowercased"""
+	return char_rule(label, lambda o, n: any(o.lower() in olds and n.lower() in news for olds, news in pairs))
+
+
+DIFF_RULES = [
+	# Syntaxique
+	window_rule('s long', 0, [('ſ', 'sz')]),
+	# Alphabet
+	# P2
+	# ocr errors
+	window_rule('erreur OCR', 0, [('lf', 's'), ('ſ', 'lf'), ('r', 't'), ('n', 'r'), ('i', 'l'), ('u', 'n'), ('l', 'ij')]),
+	# Anecdotique
+	# P10
+	# Consonnes muettes internes (ou pas, en fait) : diacritique ou étymologique (mais on ne sait pas différencier)
+	# diacritique qui indique la prononciation du n : beſoing -> besoin
+	# ou étymologique : loing -> loin, loingtaine -> lointaine
+	window_rule('oing → oin', -3, [(['oing'], ['oin¤'])]),
+	# P8
+	# voyelles nasales e tildé
+	window_rule('ain ↔ ein', 0, [(['ain'], ['ein'])], 2),
+	# voyelles / diphtongues et hiatus / ancien hiatus eoi
+	# P6b+
+	window_rule('eoi → oi', 0, [(['eoi'], ['¤oi'])], 2),
+	# P8
+	# voyelles nasales e tildé
+	window_rule('ein → in', 0, [(['ein'], ['¤in'])], 2),
+	# (vermeillon -> verm¤illon) : eil -> ¤il ou ei -> ¤i (pas d'autre occurrence à part veit -> v¤it) ?
+	# voyelles / diphtongues et hiatus / ancien hiatus -> hiatus par analogie et pas historique
+	# P6b+
+	window_rule('eil → il', 0, [(['eil'], ['¤il'])], 2),
+	# consonnes doubles / consonnes doubles phonogrammiques + (historique) ?
+	# P9 historiques
+	window_rule('nn → mn', 0, [(['nn'], ['mn'])], 1),
+	# consonnes muettes internes, consonnes étymologiques ++
+	# P10
+	window_rule('mt/nt → mpt', 0, [(['n¤t', '¤nt'], ['mpt'])], 2),
+	# Question Jonathan : pourquoi pas (old[i:i+3] in ['m¤t','¤mt'] and new[i:i+3] == 'mpt') ?
+	window_rule('mt/nt → mpt', -1, [(['m¤t'], ['mpt'])], 1),
+	# ept → et / ipt → it / opc → oc
+	# consonnes muettes internes, consonnes étymologiques ++
+	# P10
+	window_rule('suppression lettre étymologique', -1, [(['ept'], ['e¤t']), (['ipt'], ['i¤t']), (['opc'], ['o¤c'])]),
+	# latin eus/us → e
+	# PAS TROUVE DANS CORPUS
+	window_rule('terminaison latine us → e', 0, [(['eus'], ['e¤¤'])], 2),
+	# latinisme
+	window_rule('terminaison latine us → e', 0, [(['us'], ['e¤', '¤e'])], 1),
+	# co¤teaux -> coteaux
+	# P6a+
+	window_rule('au → eau', 0, [(['¤au'], ['eau'])], 2),
+	# cque/que → c (avecques, avecque, aveque), aueque -> avec¤¤, donques -> donc¤¤¤, vainquera-vainc¤¤ra
+	# (the que → ¤¤¤ alternative applies after any char)
+	# consonnes muettes internes, consonnes étymologiques ++
+	# P10+
+	(lambda o, n: o == 'q' and n == '¤',
+		lambda old, new, i: (i-1 > 0 and old[i-1] == new[i-1] == 'c'
+			and old[i:i+4] == 'ques' and new[i:i+4] == '¤¤¤¤'
+			or old[i:i+3] == 'que' and new[i:i+3] == '¤¤¤'),
+		0, 4, 'cque/que → c', 3),
+	window_rule('cque/que → c', 0, [(['que'], ['c¤¤'])], 2),
+	# séparation
+	# segmentation - désagglutination
+	window_rule('séparation avec apostrophe', 0, [(['¤¤'], ["' ", "’ "])], 1),
+	# Alphabet -> ligature
+	window_rule('œ ↔ oe', 0, [(['œ¤', '¤œ'], ['oe']), (['oe'], ['œ¤', '¤œ'])], 1),
+	# segmentation - agglutination
+	window_rule('contraction', 0, [(["' ", "’ "], ['¤¤'])], 1),
+	# P4c+ timbre de E
+	# voyelles orales : alternance ai/ei vs è¤ ¤è e¤ ¤e
+	window_rule('ai/ei → e/è', 0, [(['ai', 'ei'], ['è¤', '¤è', 'e¤', '¤e'])], 1),
+	# P8
+	# voyelles nasales a tildé
+	window_rule('an/am ↔ en/em', 0, [(['an'], ['en']), (['en'], ['an']), (['am'], ['em']), (['em'], ['am'])], 1),
+	# P10
+	# consonnes muettes internes étymologiques magdeleine / magdelene +
+	window_rule('gd → d', 0, [(['gd'], ['¤d'])], 1),
+	# P10
+	# consonnes muettes internes étymologiques
+	window_rule('ct → t', 0, [(['ct'], ['¤t'])], 1),
+	# ex : conte -> comte, viconte -> cicomte, contesse -> comtesse
+	# P10
+	# consonnes muettes internes étymologiques +
+	window_rule('nt → mt', 0, [(['nt'], ['mt'])], 1),
+	window_rule('qu ↔ c', 0, [(['qu'], ['¤c', 'c¤']), (['¤c', 'c¤'], ['qu'])], 1),
+	window_rule('f → ph', 0, [(['¤f', 'f¤'], ['ph'])], 1),
+	window_rule('as → â', 0, [(['aſ', 'as'], ['â¤'])], 1),
+	window_rule('es → é', 0, [(['eſ', 'es'], ['é¤'])], 1),
+	# double consonne avec s long
+	window_rule('double consonne', 0, [(['ſ¤', '¤ſ'], ['ss'])], 1),
+	window_rule('suppression l après voyelle', -1, [(['ul', 'il'], ['i¤', 'u¤'])]),
+	window_rule('ph → f', 0, [(['ph'], ['¤f', 'f¤'])], 1),
+	window_rule('o ↔ au', 0, [(['¤o', 'o¤'], ['au']), (['au'], ['¤o', 'o¤'])], 1),
+	window_rule('esperluette', 0, [(['&¤', '¤&'], ['et'])], 1),
+	# P2
+	# Alphabet
+	window_rule('eszett', 0, [(['ß¤', '¤ß'], ['ss'])], 1),
+	window_rule('eu → u', 0, [(['eu', 'eû', 'ev', 'eü'], ['¤u', '¤û'])], 1),
+	window_rule('terminaison y → is', 0, [(['y¤'], ['is'])], 1),
+	window_rule('voyelle + lt → voyelle + t', 0, [(['lt'], ['¤t'])], 1),
+	window_rule('gn → nn', 0, [(['gn'], ['nn'])], 1),
+	window_rule('élision es → apostrophe', 0, [(['es'], ["¤'", "¤’", "'¤", "’¤"])], 1),
+	# tilde
+	window_rule('tilde → voyelle + m/n', 0, [
+		(['ã¤', '¤ã'], ['am', 'an']),
+		(['ẽ¤', '¤ẽ'], ['em', 'en']),
+		(['õ¤', '¤õ', 'ō¤', '¤ō'], ['om', 'on']),
+		(['ũ¤', '¤ũ'], ['um', 'un'])], 1),
+	window_rule('sc → s', 0, [(['sc', 'sç', 'ſc', 'ſç'], ['s¤'])], 1),
+	# double consonne
+	(lambda o, n: o == '¤' or n == '¤',
+		lambda old, new, i: (i+1 < len(old) and
+			(old[i] == '¤' and old[i+1] == new[i] and new[i] == new[i+1]
+			or new[i] == '¤' and new[i+1] == old[i] and old[i] == old[i+1])),
+		0, 2, 'double consonne', 1),
+	(lambda o, n: o == '¤' or n == '¤',
+		lambda old, new, i: (i-1 > 0 and
+			(old[i] == '¤' and old[i-1] == new[i] and new[i] == new[i-1]
+			or new[i] == '¤' and new[i-1] == old[i] and old[i] == old[i-1])),
+		0, 2, 'double consonne', 0),
+	char_rule('cédille', lambda o, n: (o, n) in [('c', 'ç'), ('ç', 'c')]),
+	char_rule(y_label, lambda o, n: o == 'y' and n in ['i', 'ï']),
+	char_rule('i → y', lambda o, n: o in ['i', 'ï'] and n == 'y'),
+	char_rule('x/z → s', lambda o, n: o in ['x', 'z'] and n == 's'),
+	char_rule('c → s', lambda o, n: o == 'c' and n == 's'),
+	# si és -> ez final ou es -> ez final: consonne muette finale / consonne diacritique (ex : eſtimés-estimez, laiſſes-laissez)
+	# P12b
+	char_rule('s → z', lambda o, n: o in 'sſ' and n == 'z'),
+	char_rule('s → t', lambda o, n: o in 'sſ' and n == 't'),
+	char_rule('s → c', lambda o, n: o in 'sſ' and n == 'c'),
+	char_rule('d → t', lambda o, n: o == 'd' and n == 't'),
+	char_rule('t → d', lambda o, n: o == 't' and n == 'd'),
+	char_rule(o_label, lambda o, n: o == 'o' and n == 'a'),
+	char_rule('apostrophe → e', lambda o, n: o in "'’" and n == 'e'),
+	char_rule('o → œ', lambda o, n: o == 'o' and n == 'œ'),
+	# æ/œ
+	char_rule('æ → e', lambda o, n: o == 'æ' and n in 'eé'),
+	char_rule('œ → e', lambda o, n: o == 'œ' and n in 'eé'),
+	char_rule('ajout h mot grec', lambda o, n: o == '¤' and n == 'h'),
+	accent_rule('ajout accent aigu', [('e', 'é')]),
+	accent_rule('ajout accent grave', [('a', 'à'), ('e', 'è'), ('i', 'ì'), ('o', 'ò'), ('u', 'ù')]),
+	accent_rule('ajout accent circonflexe', [('a', 'â'), ('e', 'ê'), ('i', 'î'), ('o', 'ô'), ('u', 'û')]),
+	accent_rule('ajout tréma', [('a', 'ä'), ('e', 'ë'), ('i', 'ï'), ('o', 'ö'), ('u', 'ü')]),
+	accent_rule('retrait accent aigu', [('é', 'e')]),
+	accent_rule('retrait accent grave', [('à', 'a'), ('è', 'e'), ('ì', 'i'), ('ò', 'o'), ('ù', 'u')]),
+	accent_rule('retrait accent circonflexe', [('â', 'a'), ('ê', 'e'), ('î', 'i'), ('ô', 'o'), ('û', 'u')]),
+	accent_rule('retrait tréma', [('ä', 'a'), ('ë', 'e'), ('ï', 'i'), ('ö', 'o'), ('ü', 'u')]),
+	accent_rule('changement accent', [('äàâ', 'äàâ'), ('ëèê', 'ëèê'), ('ïìî', 'ïìî'), ('öòô', 'öòô'), ('üùû', 'üùû')]),
+	char_rule('apostrophe', lambda o, n: o in ["'", "’"] and n in ["'", "’"]),
+	char_rule('fusion', lambda o, n: o in [' ', '-'] and n in ['-', '¤']),
+	char_rule('séparation', lambda o, n: o in ['¤', '-'] and n in ['-', ' ']),
+	char_rule('ajout d/t terminaison', lambda o, n: o == '¤' and n in ['d', 't']),
+	char_rule('lettre ramiste', lambda o, n: o in 'uv' and n in 'uv' or o in 'ij' and n in 'ij'),
+	char_rule('suppression lettre étymologique', lambda o, n: o in 'ſshtdcçb' and n == '¤'),
+]
+
+# (majuscule, rules that may apply) of aligned chars, compiled by pair_rules
+PAIR_RULES = {}
+
+
+def pair_rules(o, n):
+	"""Returns (majuscule, [(match, start, size, label, skip)]) of rules that may apply to aligned chars o and n
+
+	Rules are selected once for each pair of chars, in priority order.
+	"""
+	res = PAIR_RULES.get((o, n))
+	if res is None:
+		upper = o == n.upper() or n == o.upper()
+		rules = [rule[1:] for rule in DIFF_RULES if rule[0](o, n)]
+		res = PAIR_RULES[o, n] = (upper, rules)
+	return res
+
+
+# rule patterns
+TILDE = re.compile(r'([ãẽõ])([mn]?)')
+TILDE_VOWELS = {'ã': 'a', 'ẽ': 'e', 'õ': 'o'}
+OLD_CHARS = str.maketrans({'ſ': 's', 'ß': 'ss', '&': 'et'})
+DV = re.compile(r'([aeiou])dv')
+ENS = re.compile(r'([ae])ns$')
+OI = re.compile(r'(.{2,})oi([est])')
+OIS = re.compile(r'(.{2,})oi([st])$')
+OIENT = re.compile(r'(.{2,})oient$')
+EZ = re.compile(r'e[Zz]$')
+ES = re.compile(r'és$')
+VOWEL_S = re.compile(r'[aeiou]s[mnqt]', flags = re.IGNORECASE)
+CIRCUMFLEX = [(re.compile(vowel + r's([mnqt])'), accent + r'\1') for vowel, accent in zip('aeiou', 'âêîôû')]
+ES_ACUTE = [(re.compile(r'es([mnqt])'), r'é\1'), (re.compile(r'Es([mnqt])'), r'É\1')]
+E_ACUTE = re.compile(r'e([^$(s$)])')
+
+
+def apply_rules(s, max_candidates = None):
+	"""Yields modernization candidates of s, most likely first, without duplicates
+
+	Candidates are generated lazily : callers can stop at the first one they accept.
+
+	:param max_candidates: maximal number of candidates, None for all
+	"""
+	seen = set()
+	for mod in rule_candidates(s):
+		if mod not in seen:
+			if len(seen) == max_candidates:
+				return
+			seen.add(mod)
+			yield mod
+
+
+def rule_candidates(s):
+	"""Yields modernization candidates of s, most likely first (with duplicates)"""
+
+	# s long, eszett, esperluette
+	s = s.translate(OLD_CHARS)
 
 	# tilde
-	s = s.replace('ãm','amm')
-	s = s.replace('ãn','ann')
-	s = s.replace('ã','an')
-	s = s.replace('ẽm','emm')
-	s = s.replace('ẽn','enn')
-	s = s.replace('ẽ','en')
-	s = s.replace('õm','omm')
-	s = s.replace('õn','onn')
-	s = s.replace('õ','on')
-	
+	if 'ã' in s or 'ẽ' in s or 'õ' in s:
+		s = TILDE.sub(lambda m: TILDE_VOWELS[m.group(1)] + (m.group(2) * 2 if m.group(2) else 'n'), s)
+
 	# scavoir
-	s = re.sub(r'^([Ss])[CÇcç]', r'\1', s)
-	s = re.sub(r'^scau', r'sau', s)
+	if s[:1] in ('S', 's') and s[1:2] in ('C', 'Ç', 'c', 'ç'):
+		s = s[0] + s[2:]
+	if s.startswith('scau'):
+		s = 'sau' + s[4:]
 
 	# terminaison oing
-	s = re.sub(r'oing$', 'oin', s)
+	if s.endswith('oing'):
+		s = s[:-1]
 
 	# terminaison y
-	s = re.sub(r'y$','i', s)
+	if s.endswith('y'):
+		s = s[:-1] + 'i'
 
 	# sch
 	s = s.replace('sch','ch')
 
-	
-	s = re.sub(r'([ao])ye$', r'\1ie', s)
+	if s.endswith(('aye', 'oye')):
+		s = s[:-2] + 'ie'
+
+	mods = [s]
+	yield s
 
-	mods.append(s)
+	def add(mod):
+		mods.append(mod)
+		return mod
 
 	# suppression c étymologique
 	if 'ct' in s:
-		mods.append(s.replace('ct', 't'))
+		yield add(s.replace('ct', 't'))
 
 	# suppression d étymologique
-	if re.search(r'[aeiou]dv', s):
-		mods.append(re.sub(r'([aeiou])dv', r'\1v', s))
+	if DV.search(s):
+		yield add(DV.sub(r'\1v', s))
 
 	# ajout d'un t ou d final (presens → présents)
-	if re.search(r'[ae]ns$', s):
-		mods.append(re.sub(r'([ae])ns$', r'\1nts', s))
-		mods.append(re.sub(r'([ae])ns$', r'\1nds', s))
+	if ENS.search(s):
+		yield add(ENS.sub(r'\1nts', s))
+		yield add(ENS.sub(r'\1nds', s))
 
 	# terminaison de verbe
-	if re.search(r'(.{2,})oi([est])', s):
-		mods.append(re.sub(r'(.{2,})oi([st])$', r'\1ai\2', s))
-		mods.append(re.sub(r'(.{2,})oient$', r'\1aient', s))
+	if OI.search(s):
+		yield add(OIS.sub(r'\1ai\2', s))
+		yield add(OIENT.sub(r'\1aient', s))
 
-	if re.search(r'e[Zz]$', s):
-		mods.append(re.sub(r'e[Zz]$', 'és', s))
+	if EZ.search(s):
+		yield add(EZ.sub('és', s))
 
-	if re.search(r'és$', s):
-		mods.append(re.sub(r'és$', 'ez', s))
+	if ES.search(s):
+		yield add(ES.sub('ez', s))
 
-	if re.search(r'[aeiou]s[mnqt]', s, flags = re.IGNORECASE):
-		mods.append(s.replace('st', 't'))
-		mods.append(s.replace('est', 'ét'))
+	if VOWEL_S.search(s):
+		yield add(s.replace('st', 't'))
+		yield add(s.replace('est', 'ét'))
 		# try ast → ât
 		s2 = s
-		s2 = re.sub(r'as([mnqt])', r'â\1', s2)
-		s2 = re.sub(r'es([mnqt])', r'ê\1', s2)
-		s2 = re.sub(r'is([mnqt])', r'î\1', s2)
-		s2 = re.sub(r'os([mnqt])', r'ô\1', s2)
-		s2 = re.sub(r'us([mnqt])', r'û\1', s2)
-		mods.append(s2)
+		for pattern, repl in CIRCUMFLEX:
+			s2 = pattern.sub(repl, s2)
+		yield add(s2)
 		# try est → ét
 		s3 = s
-		s3 = re.sub(r'es([mnqt])', r'é\1', s3)
-		s3 = re.sub(r'Es([mnqt])', r'É\1', s3)
-		mods.append(s3)
+		for pattern, repl in ES_ACUTE:
+			s3 = pattern.sub(repl, s3)
+		yield add(s3)
 
 	if 'y' in s:
-		mods.append(s.replace('y', 'i'))
+		yield add(s.replace('y', 'i'))
 
 	if 'ü' in s:
-		mods.append(s.replace('ü', 'u'))
-		mods.append(s.replace('eü', 'u'))
+		yield add(s.replace('ü', 'u'))
+		yield add(s.replace('eü', 'u'))
 
 	# lettres ramistes, accents
-	for mod in mods.copy():
+	for mod in mods:
 		if 'is' in s:
-			mods.append(mod.replace('is', 'î'))
+			yield mod.replace('is', 'î')
 		if 'ai' in s:
-			mods.append(mod.replace('ai', 'aî'))
+			yield mod.replace('ai', 'aî')
 		if 'u' in mod:
-			mods.append(mod.replace('u', 'v'))
+			yield mod.replace('u', 'v')
 		if 'v' in mod:
-			mods.append(mod.replace('v', 'u'))
+			yield mod.replace('v', 'u')
 		if 'e' in mod:
-			mods.append(re.sub(r'e([^$(s$)])', r'é\1', mod))
-
-	return mods
\ No newline at end of file
+			yield E_ACUTE.sub(r'é\1', mod)
\ No newline at end of file
@@ -1,49 +1,178 @@
+import os
 import glob
+import json
+import heapq
+import hashlib
+import tempfile
+import multiprocessing
+from collections import Counter
+from contextlib import nullcontext
+from functools import partial
+from itertools import groupby
+from operator import itemgetter
+from more_itertools import chunked, consume
 
+# number of distinct word pairs counted in memory by a process of extract_dic,
+# above which counts are written to sorted run files and merged on disk
+MAX_PAIRS = 1 << 22
 
-def pair_to_dic(old, new, dic, delta_only = False):	
-	# delta only : ignore identical words
-	if (delta_only and old == new):
-		return
-	# pair already in dic : increment count
-	if old in dic and new in dic[old]:
-		dic[old][new] += 1
-	# pair not in dic : add to dic
-	else:
-		dic[old] = {new: 1}
+# version of the manifests of extract_dic_incremental, to increase when their format changes
+MANIFEST_VERSION = 1
 
 
-def dic_to_file(dic, file):
+def lst_to_tsv(lst, file, buffer_size = 4096):
+	# lst may be any iterable (e.g. a generator) : rows are written by chunks of buffer_size rows
 	with open(file, 'w', encoding = 'utf8') as f:
-		for old in dic:
-			for new in dic[old]:
-				f.write(f'{old}\t{new}\t{dic[old][new]}\n')
+		separator = ''
+		for chunk in chunked(lst, buffer_size):
+			f.write(separator + '\n'.join(['\t'.join(e) for e in chunk]))
+			separator = '\n'
+
+
+def extract_dic(src_dir, dst_file, delta_only = True, jobs = 1, max_pairs = MAX_PAIRS):
+	"""Writes (old, new, count) of word pairs of the .tsv files of src_dir to dst_file, sorted by pair
+
+	Files are counted in `jobs` worker processes, their counts being merged afterwards.
+	Above `max_pairs` distinct pairs, counts are merged on disk instead of in memory.
+
+	:param delta_only: ignore identical words
+	"""
+	files = sorted(glob.glob(src_dir + '/*.tsv'))
+
+	with tempfile.TemporaryDirectory(dir = os.path.dirname(os.path.abspath(dst_file))) as tmp_dir:
+		# count pairs of each file
+		count = partial(count_pairs, delta_only = delta_only, max_pairs = max_pairs, tmp_dir = tmp_dir)
+		counts = Counter()
+		runs = []
+		with multiprocessing.Pool(jobs) if jobs > 1 else nullcontext() as pool:
+			for file_counts, file_runs in (pool.imap_unordered(count, files) if pool is not None else map(count, files)):
+				counts.update(file_counts)
+				runs += file_runs
+				if len(counts) > max_pairs:
+					runs.append(write_run(counts, tmp_dir))
+					counts = Counter()
+		# merge counts
+		if runs:
+			runs.append(write_run(counts, tmp_dir))
+			pairs = merge_runs(runs)
+		else:
+			pairs = sorted(counts.items())
+		# write dic to tsv
+		write_pairs(pairs, dst_file)
 
 
-def lst_to_tsv(lst, file):
-	open(file, 'w', encoding = 'utf8').write('\n'.join(['\t'.join(e) for e in lst]))
+def extract_dic_incremental(src_dir, dst_file, manifest_file, delta_only = True, jobs = 1, max_pairs = MAX_PAIRS):
+	"""Like extract_dic, counting again only the files that are new or changed since the last call
 
+	The manifest (JSON) keeps the content hash of each file, the counts of each file
+	being kept in a sorted run file named after its hash, in the directory manifest_file + '.parts'.
+	The dictionary is then rebuilt by merging the counts of all files.
 
-def extract_dic(src_dir, dst_file, delta_only = True):
-	
-	# init dic and file list
-	dic = {}
-	files = [f for f in glob.glob(src_dir + '/*.tsv')]
+	Returns the list of files counted.
+	"""
+	parts_dir = manifest_file + '.parts'
+	os.makedirs(parts_dir, exist_ok = True)
+	manifest = {}
+	if os.path.exists(manifest_file):
+		with open(manifest_file, 'r', encoding = 'utf8') as f:
+			manifest = json.load(f)
+	known = {}
+	if manifest.get('version') == MANIFEST_VERSION and manifest.get('delta_only') == delta_only:
+		known = manifest['files']
 
-	# process files
-	for f in files:
-		print(f'Extracting words from {f}...')
-		# read file
-		lines = open(f, 'r', encoding = 'utf8').readlines()
-		# process lines
-		for line in lines:
+	# hash files, count new or changed ones
+	files = {os.path.basename(f): f for f in sorted(glob.glob(src_dir + '/*.tsv'))}
+	digests = {name: file_digest(f) for name, f in files.items()}
+	parts = {name: os.path.join(parts_dir, f'{digest}.tsv') for name, digest in digests.items()}
+	todo = [name for name in files if known.get(name) != digests[name] or not os.path.exists(parts[name])]
+	count = partial(count_file, delta_only = delta_only, max_pairs = max_pairs)
+	with multiprocessing.Pool(jobs) if jobs > 1 and len(todo) > 1 else nullcontext() as pool:
+		args = [(files[name], parts[name]) for name in todo]
+		consume(pool.starmap(count, args) if pool is not None else (count(*a) for a in args))
+
+	# merge counts of all files
+	write_pairs(merge_runs(parts.values()), dst_file)
+	with open(manifest_file, 'w', encoding = 'utf8') as f:
+		json.dump({'version': MANIFEST_VERSION, 'delta_only': delta_only, 'files': digests}, f, indent = '\t')
+	# remove counts of removed or changed files
+	for part in set(os.listdir(parts_dir)) - {f'{digest}.tsv' for digest in digests.values()}:
+		os.remove(os.path.join(parts_dir, part))
+	return [files[name] for name in todo]
+
+
+def file_digest(file):
+	"""Returns the sha256 hash of the content of file"""
+	digest = hashlib.sha256()
+	with open(file, 'rb') as f:
+		for block in iter(lambda: f.read(1 << 20), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+
+def count_file(file, part_file, delta_only = True, max_pairs = MAX_PAIRS):
+	"""Writes (old, new, count) of word pairs of file to part_file, sorted by pair"""
+	tmp_dir = os.path.dirname(os.path.abspath(part_file))
+	counts, runs = count_pairs(file, delta_only, max_pairs, tmp_dir)
+	if runs:
+		runs.append(write_run(counts, tmp_dir))
+		write_pairs(merge_runs(runs), part_file + '.tmp')
+		for run in runs:
+			os.remove(run)
+	else:
+		write_pairs(sorted(counts.items()), part_file + '.tmp')
+	os.replace(part_file + '.tmp', part_file)
+
+
+def count_pairs(file, delta_only = True, max_pairs = MAX_PAIRS, tmp_dir = None):
+	"""Returns (counts, runs) of word pairs of a word-aligned file
+
+	counts is a Counter of (old, new) pairs, runs the list of sorted run files
+	(see write_run) holding the other counts, when there are more than max_pairs pairs.
+	"""
+	print(f'Extracting words from {file}...')
+	counts = Counter()
+	runs = []
+	with open(file, 'r', encoding = 'utf8') as f:
+		for line in f:
 			# retrieve word pair
 			try:
 				old, new = line.rstrip().split('\t')
-			except:
+			except ValueError:
 				print(line)
-			# add word pair to dictionary
-			pair_to_dic(old, new, dic, delta_only)
+				continue
+			if delta_only and old == new:
+				continue
+			counts[old, new] += 1
+			if len(counts) > max_pairs:
+				runs.append(write_run(counts, tmp_dir))
+				counts = Counter()
+	return counts, runs
+
+
+def write_run(counts, tmp_dir = None):
+	"""Writes counts of pairs sorted by pair to a new file of tmp_dir, returns its path"""
+	fd, file = tempfile.mkstemp(suffix = '.tsv', dir = tmp_dir)
+	os.close(fd)
+	write_pairs(sorted(counts.items()), file)
+	return file
+
+
+def write_pairs(pairs, file):
+	"""Writes (old, new, count) rows of ((old, new), count) items to file"""
+	with open(file, 'w', encoding = 'utf8') as f:
+		for (old, new), n in pairs:
+			f.write(f'{old}\t{new}\t{n}\n')
+
+
+def read_run(file):
+	with open(file, 'r', encoding = 'utf8') as f:
+		for line in f:
+			old, new, n = line.rstrip('\n').split('\t')
+			yield (old, new), int(n)
+
 
-	# write dic to tsv
-	dic_to_file(dic, dst_file)
\ No newline at end of file
+def merge_runs(runs):
+	"""Yields (pair, count) of sorted run files, sorted by pair, counts of a pair being summed"""
+	merged = heapq.merge(*[read_run(run) for run in runs], key = itemgetter(0))
+	for pair, group in groupby(merged, key = itemgetter(0)):
+		yield pair, sum(n for _, n in group)
\ No newline at end of file
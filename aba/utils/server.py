@@ -0,0 +1,199 @@
+# server.py
+
+import json
+import time
+import asyncio
+from collections import deque
+
+# default number of sentences modernized at once, and time waited to fill a batch (s)
+BATCH_SIZE = 64
+BATCH_DELAY = 0.005
+
+# number of last requests used for latency percentiles
+LATENCY_WINDOW = 1000
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+async def start_server(modernizer, host = None, port = None, socket_path = None,
+	batch_size = BATCH_SIZE, batch_delay = BATCH_DELAY):
+	"""Starts serving modernizer over HTTP, returns the list of servers
+
+	POST /modernize : plain text sentence, or JSON list of sentences
+		(or {"sentences": [...]}), answered the same way
+	GET /health : JSON metrics (throughput, latency percentiles)
+
+	Sentences of concurrent requests are modernized together, by batches
+	of at most `batch_size` sentences, in a thread.
+
+	:param host, port: TCP address, None for no TCP server
+	:param socket_path: Unix socket path, None for no Unix socket server
+	"""
+	queue = asyncio.Queue()
+	metrics = {
+		'start': time.monotonic(),
+		'requests': 0,
+		'sentences': 0,
+		'batches': 0,
+		'errors': 0,
+		'latencies': deque(maxlen = LATENCY_WINDOW),
+	}
+	batcher = asyncio.create_task(batch_loop(queue, modernizer, batch_size, batch_delay, metrics))
+
+	async def handle(reader, writer):
+		await handle_connection(reader, writer, queue, metrics)
+
+	servers = []
+	if port is not None:
+		servers.append(await asyncio.start_server(handle, host, port))
+	if socket_path is not None:
+		servers.append(await asyncio.start_unix_server(handle, socket_path))
+	for server in servers:
+		server.batcher = batcher
+	return servers
+
+
+async def batch_loop(queue, modernizer, batch_size, batch_delay, metrics):
+	"""Modernizes sentences of queued (sentences, future) requests by batches"""
+	loop = asyncio.get_running_loop()
+	while True:
+		# wait for a request, then for others until the batch is full or the delay is over
+		batch = [await queue.get()]
+		size = len(batch[0][0])
+		deadline = loop.time() + batch_delay
+		while size < batch_size:
+			try:
+				item = await asyncio.wait_for(queue.get(), deadline - loop.time())
+			except asyncio.TimeoutError:
+				break
+			batch.append(item)
+			size += len(item[0])
+		# modernize all sentences in a thread, then answer each request
+		sentences = [s for (request, _) in batch for s in request]
+		try:
+			results = await loop.run_in_executor(None, lambda: list(modernizer.modernize_many(sentences)))
+		except Exception as e:
+			for (_, future) in batch:
+				# (request cancelled meanwhile)
+				if not future.done():
+					future.set_exception(e)
+			continue
+		metrics['batches'] += 1
+		start = 0
+		for (request, future) in batch:
+			if not future.done():
+				future.set_result(results[start:start + len(request)])
+			start += len(request)
+
+
+async def modernize_request(sentences, queue):
+	future = asyncio.get_running_loop().create_future()
+	await queue.put((sentences, future))
+	return await future
+
+
+async def handle_connection(reader, writer, queue, metrics):
+	"""Answers HTTP requests of a connection (kept alive unless asked otherwise)"""
+	try:
+		while True:
+			# request line and headers
+			line = await reader.readline()
+			if not line:
+				break
+			try:
+				method, path, _ = line.decode('latin-1').split(' ', 2)
+			except ValueError:
+				await respond(writer, 400, 'text/plain', b'bad request line')
+				break
+			headers = {}
+			while True:
+				line = await reader.readline()
+				if line in (b'\r\n', b'\n', b''):
+					break
+				name, _, value = line.decode('latin-1').partition(':')
+				headers[name.strip().lower()] = value.strip()
+			try:
+				length = int(headers.get('content-length', 0))
+				if length < 0:
+					raise ValueError
+			except ValueError:
+				metrics['errors'] += 1
+				await respond(writer, 400, 'text/plain', b'bad content length')
+				break
+			body = await reader.readexactly(length)
+			# answer
+			start = time.monotonic()
+			status, content_type, content = await route(method, path, headers, body, queue, metrics)
+			if path == '/modernize':
+				metrics['latencies'].append(time.monotonic() - start)
+			await respond(writer, status, content_type, content)
+			if headers.get('connection', '').lower() == 'close':
+				break
+	except (asyncio.IncompleteReadError, ConnectionError):
+		pass
+	finally:
+		writer.close()
+
+
+async def route(method, path, headers, body, queue, metrics):
+	"""Returns (status, content type, content) of the answer to a request"""
+	if path == '/health':
+		if method != 'GET':
+			return 405, 'text/plain', b'use GET'
+		return 200, 'application/json', json.dumps(health(metrics)).encode('utf8')
+	if path != '/modernize':
+		return 404, 'text/plain', b'unknown path'
+	if method != 'POST':
+		return 405, 'text/plain', b'use POST'
+	metrics['requests'] += 1
+	try:
+		text = body.decode('utf8')
+		is_json = headers.get('content-type', '').startswith('application/json')
+		if is_json:
+			sentences = json.loads(text)
+			if isinstance(sentences, dict):
+				sentences = sentences['sentences']
+			if not (isinstance(sentences, list) and all(isinstance(s, str) for s in sentences)):
+				raise ValueError('expected a list of sentences')
+		else:
+			sentences = [text]
+	except (ValueError, KeyError) as e:
+		metrics['errors'] += 1
+		return 400, 'text/plain', str(e).encode('utf8')
+	try:
+		results = await modernize_request(sentences, queue)
+	except Exception as e:
+		metrics['errors'] += 1
+		return 500, 'text/plain', str(e).encode('utf8')
+	metrics['sentences'] += len(sentences)
+	if is_json:
+		return 200, 'application/json', json.dumps({'sentences': results}, ensure_ascii = False).encode('utf8')
+	return 200, 'text/plain; charset=utf-8', results[0].encode('utf8')
+
+
+async def respond(writer, status, content_type, content):
+	writer.write(
+		f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+		f'Content-Type: {content_type}\r\n'
+		f'Content-Length: {len(content)}\r\n'
+		'\r\n'.encode('latin-1') + content)
+	await writer.drain()
+
+
+def health(metrics):
+	"""Returns throughput since start and latency percentiles of the last requests (ms)"""
+	uptime = time.monotonic() - metrics['start']
+	latencies = sorted(metrics['latencies'])
+	res = {
+		'status': 'ok',
+		'uptime': round(uptime, 3),
+		'requests': metrics['requests'],
+		'sentences': metrics['sentences'],
+		'batches': metrics['batches'],
+		'errors': metrics['errors'],
+		'sentences_per_second': round(metrics['sentences'] / uptime, 3) if uptime > 0 else 0,
+	}
+	for p in (50, 90, 99):
+		value = latencies[min(len(latencies) - 1, len(latencies) * p // 100)] if latencies else 0
+		res[f'latency_p{p}_ms'] = round(value * 1000, 3)
+	return res
\ No newline at end of file
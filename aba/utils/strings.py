@@ -1,55 +1,170 @@
-# deactivated to avoid installing ASR_metrics
-#from ASR_metrics import utils as metrics
-from itertools import product
-from more_itertools import consume
+import os
+import re
+from array import array
+from collections import deque
+from functools import lru_cache
+from more_itertools import consume, chunked
+from .vocab import Vocabulary, GAP
+
+# optional : vectorized alignment engine
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+# number of pairs of sequences compared at once by levenshtein_many
+DISTANCE_BATCH_SIZE = 8192
+
+# score of matrix cells outside the band
+NEG = -(1 << 40)
+
+# traceback directions (origin of each matrix cell)
+DIAG, LEFT, TOP = 1, 2, 3
+
+# default band margin for alignments (band is widened when too narrow)
+BAND_MARGIN = 8
+
+# default number of word pair scores kept in cache
+SCORE_CACHE_SIZE = 1 << 17
+
+# default number of matrix cells above which alignment is done in linear space
+MAX_CELLS = 1 << 24
+
+# band width (cells per row) from which rows are filled with numpy
+NUMPY_MIN_WIDTH = 64
+
+# number of lines sent at once to alignment worker processes
+CHUNK_SIZE = 64
+
+# number of chunks sent to worker processes and not yet written
+PENDING_CHUNKS = 64
+
+# substitution matrix and score cache of alignment worker processes
+worker = {}
+
+# tokenizer : words, ending at the first hyphen or apostrophe
+# (punctuation symbols are separators, like whitespace)
+SEPARATORS = r'\s!"\\()*,./:;>?\[\]^«¬»„…'
+WORD = r"[^{0}'’-]*['’-]|[^{0}'’-]+"
+TOKENS = re.compile(WORD.format(SEPARATORS))
+# same, skipping tags (<i>, </i>...)
+TOKENS_TAGS = re.compile(r'<[^<>]*>|(' + WORD.format(SEPARATORS + '<') + ')')
 
 
 # alignment
 
-def align_words(file):
+def align_words(file, cache = None, max_cells = MAX_CELLS, pool = None):
+	"""Yields aligned word pairs of a 2-columns .tsv file
 
-	res = []
+	Lines are read lazily by chunks of CHUNK_SIZE lines, progress is computed from bytes read.
 
-	# init substitution matrix
+	:param cache: word pair score cache from score_cache(), built with a vocabulary,
+		to share between files
+	:param max_cells: number of matrix cells above which lines are aligned in linear space
+	:param pool: multiprocessing pool initialized with init_align_worker(),
+		chunks are then aligned in worker processes (a few chunks per worker at once)
+	"""
+
+	# init substitution matrix and score cache
 	submat = init_submat_chars()
+	if cache is None:
+		cache = score_cache(submat = submat, mode = 'words', vocab = Vocabulary())
 
-	# read file
-	with open(file, 'r', encoding = 'utf8') as src:
-		lines = src.readlines()
-  
-	nbLines = len(lines)
-	percent = int(nbLines / 100)
-	if percent == 0:
-	   percent = 1
-	lineNb = 0
-	# process lines and add to list
-	for line in lines:
-		lineNb += 1
-		if lineNb % percent == 0:
-			print(str(int(lineNb/percent)) + "% done...")
-		# split line
-		sequences = line.rstrip().split('\t')
-		# ignore bad lines
-		if (len(sequences) != 2):
-			print(f'\tcorpus error : bad line format\t{sequences}')
-			continue
-		# unpack sequences
-		(old, new) = sequences
-		# pre-process sequences
-		old = preprocess_tsv(old)
-		new = preprocess_tsv(new)
-		# align words with needleman-wunsch
-		(old, new) = needleman_wunsch(old, new, submat = submat, mode = 'words')
-		# post-process sequences
-		(old, new) = align_compound_words(old, new)
-		# save in list
-		for (a, b) in zip(old, new):
-			res.append((a, b))
+	# align chunks, keeping their order
+	chunks = read_chunks(file, CHUNK_SIZE)
+	if pool is None:
+		aligned = (([align_line(line, submat, cache, max_cells) for line in lines], offset)
+			for (lines, offset) in chunks)
+	else:
+		aligned = imap_bounded(pool, align_chunk, (((lines, max_cells), offset) for (lines, offset) in chunks))
 
-	return res
-		
+	# yield pairs
+	size = max(os.path.getsize(file), 1)
+	done = 0
+	for (chunk, offset) in aligned:
+		for pairs in chunk:
+			yield from pairs
+		if offset * 100 // size > done:
+			done = offset * 100 // size
+			print(str(done) + "% done...")
+
+
+def read_chunks(file, size):
+	"""Yields lists of `size` lines of a file, with the byte offset following them"""
+	with open(file, 'rb') as src:
+		lines = []
+		offset = 0
+		for line in src:
+			offset += len(line)
+			lines.append(line.decode('utf8'))
+			if len(lines) == size:
+				yield lines, offset
+				lines = []
+		if lines:
+			yield lines, offset
 
-def align_compound_words(a, b):
+
+def imap_bounded(pool, func, items, pending_max = PENDING_CHUNKS):
+	"""Yields (func(arg), tag) for each (arg, tag) of items, in order,
+	with at most `pending_max` calls sent to the pool and not yet yielded
+	"""
+	pending = deque()
+	for arg, tag in items:
+		pending.append((pool.apply_async(func, (arg,)), tag))
+		if len(pending) >= pending_max:
+			result, tag = pending.popleft()
+			yield result.get(), tag
+	while pending:
+		result, tag = pending.popleft()
+		yield result.get(), tag
+
+
+def align_line(line, submat, cache = None, max_cells = MAX_CELLS):
+	"""Returns aligned word pairs of a 2-columns .tsv line
+
+	Words are aligned as IDs of their lowercased forms, from the vocabulary of `cache`.
+	"""
+	# split line
+	sequences = line.rstrip().split('\t')
+	# ignore bad lines
+	if (len(sequences) != 2):
+		print(f'\tcorpus error : bad line format\t{sequences}')
+		return []
+	# unpack sequences
+	(old, new) = sequences
+	# pre-process sequences
+	old = preprocess_tsv(old)
+	new = preprocess_tsv(new)
+	# align words with needleman-wunsch
+	vocab = cache.vocab
+	(ids_old, ids_new) = needleman_wunsch(vocab.fold(vocab.encode(old)), vocab.fold(vocab.encode(new)),
+		submat = submat, mode = 'words', band = BAND_MARGIN, cache = cache, max_cells = max_cells)
+	old = restore_forms(ids_old, old)
+	new = restore_forms(ids_new, new)
+	# post-process sequences
+	(old, new) = align_compound_words(old, new, submat)
+	return list(zip(old, new))
+
+
+def init_align_worker():
+	"""Builds the substitution matrix and score cache of an alignment worker process"""
+	submat = init_submat_chars()
+	worker.update(submat = submat, cache = score_cache(submat = submat, mode = 'words', vocab = Vocabulary()))
+
+
+def align_chunk(args):
+	"""Returns aligned word pairs of each line of a chunk, in a worker process"""
+	lines, max_cells = args
+	return [align_line(line, worker['submat'], worker['cache'], max_cells) for line in lines]
+
+
+def restore_forms(aligned, forms):
+	"""Returns an aligned sequence with its elements replaced by `forms`, in order, gaps being kept"""
+	forms = iter(forms)
+	return [GAP if e == GAP else next(forms) for e in aligned]
+
+
+def align_compound_words(a, b, submat = None):
 	'''
 	aligns two same-sized lists of strings
 	where compound words are formatted with '¤'
@@ -59,7 +174,8 @@ def align_compound_words(a, b):
 	res_b = []
 	indexes = iter(range(len(a)))
 	costs = (1, 1, 1)
-	submat = init_submat_chars()
+	if submat is None:
+		submat = init_submat_chars()
 
 	# process lists
 	for i in indexes:
@@ -85,12 +201,12 @@ def align_compound_words(a, b):
 				# distance when concatenating with next word
 				wa = ((a[i] + ' ').strip('¤') + a[i+1]).lstrip(' ').rstrip(' ')
 				wb = ((b[i] + ' ').strip('¤') + b[i+1]).lstrip(' ').rstrip(' ')
-				distance_next = levenshtein(wa, wb, costs, submat)
+				distance_next = levenshtein(wa, wb, costs, submat, band = BAND_MARGIN)
 				
 				# distance when concatenating with previous word
 				wa = (a[i-1] + ' ' + a[i].strip('¤')).lstrip(' ').rstrip(' ')
 				wb = (b[i-1] + ' ' + b[i].strip('¤')).lstrip(' ').rstrip(' ')
-				distance_prev = levenshtein(wa, wb, costs, submat)
+				distance_prev = levenshtein(wa, wb, costs, submat, band = BAND_MARGIN)
 				
 				if (distance_next < distance_prev):
 					concatenate_with = 'next'
@@ -120,70 +236,493 @@ def align_compound_words(a, b):
 	return res_a, res_b
 
 def align_chars(s, t, submat):
-	s, t = needleman_wunsch(list(s), list(t), submat = submat)
+	s, t = needleman_wunsch(list(s), list(t), submat = submat, band = BAND_MARGIN)
 	return ''.join(s), ''.join(t)
 
-def needleman_wunsch(a, b, scores = (4, -1, -1), submat = {}, mode = 'word'): 
+def needleman_wunsch(a, b, scores = (4, -1, -1), submat = {}, mode = 'word', band = None, cache = None, max_cells = None): 
 	"""Returns alignment of sequences a and b.
 
+	Uses the vectorized engine when numpy is available and the band is wide
+	(NUMPY_MIN_WIDTH), the pure python engine otherwise. Both return the same alignment.
+
 	:param scores: Scores for match award, mismatch penalty and gap penalty
 	:type scores: tuple (match, mismatch, gap)
+	:param band: margin added to the length difference to get the band width,
+		None to fill the whole matrix
+	:param cache: score function from score_cache(), built with the same scores, submat and mode
+	:param max_cells: number of matrix cells above which the alignment is done
+		in linear space (needleman_wunsch_linear), None for no limit
+	"""
+	width = len(a) + len(b) + 1 if band is None else 2 * (abs(len(a) - len(b)) + band) + 1
+	if np is not None and width >= NUMPY_MIN_WIDTH and integer_scores(scores, submat):
+		return needleman_wunsch_numpy(a, b, scores, submat, mode, band, cache, max_cells)
+	return needleman_wunsch_python(a, b, scores, submat, mode, band, cache, max_cells)
+
+
+def needleman_wunsch_python(a, b, scores = (4, -1, -1), submat = {}, mode = 'word', band = None, cache = None, max_cells = None):
+	"""Returns alignment of sequences a and b, filling the matrix cell by cell"""
+	return align_in_band(a, b, scores, submat, mode, band, cache, max_cells, fill_python)
+
+
+def needleman_wunsch_numpy(a, b, scores = (4, -1, -1), submat = {}, mode = 'word', band = None, cache = None, max_cells = None):
+	"""Returns alignment of sequences a and b, filling the matrix row by row with numpy
+
+	Scores must be integers (cells are compared for equality in traceback).
+	"""
+	return align_in_band(a, b, scores, submat, mode, band, cache, max_cells, fill_numpy)
+
+
+def align_in_band(a, b, scores, submat, mode, band, cache, max_cells, fill):
+	"""Returns alignment of sequences a and b, only filling cells close to the diagonal
+
+	Cells (x, y) with -lower <= y - x <= upper are filled, where lower and upper
+	start at the length difference plus `band`. The band is doubled
+	until the alignment is known to be the one of the whole matrix,
+	or until it has more than `max_cells` cells (alignment is then done in linear space).
+	"""
+
+	# unpack score parameters
+	_, _, gap_penalty = scores
+
+	# scores between elements
+	pair_score = pair_scorer(a, b, scores, submat, mode, cache)
+
+	# init band
+	n = len(a)
+	m = len(b)
+	if band is None:
+		width = max(n, m)
+	else:
+		width = abs(n - m) + band
+
+	while True:
+		lower = min(width, n)
+		upper = min(width, m)
+		# too many cells : linear space
+		if max_cells is not None and (n+1) * (lower + upper + 1) > max_cells:
+			return needleman_wunsch_linear(a, b, scores, submat, mode, cache)
+		# fill matrix and traceback
+		pointers, best = fill(n, m, pair_score, gap_penalty, lower, upper)
+		align_a, align_b, offsets = traceback(a, b, pointers, lower, upper)
+		# whole matrix or exact band : done
+		if (lower == n and upper == m
+			or band_is_exact(n, m, lower, upper, offsets, best, scores, submat)):
+			return (align_a, align_b)
+		# widen band
+		width = 2 * width + 1
+
+
+def band_is_exact(n, m, lower, upper, offsets, best, scores, submat):
+	"""Returns whether an alignment found in a band is the one of the whole matrix
+
+	The path must not touch the band edges, and no path leaving the band
+	can reach the best score : such a path has at least `gaps` gaps
+	and at most (n + m - gaps) / 2 aligned pairs.
 	"""
 
 	# unpack score parameters
 	_, _, gap_penalty = scores
+	max_score = max([*scores, *(n for row in submat.values() for n in row.values())])
+
+	# path on band edges
+	lowest, highest = offsets
+	if (lower < n and lowest == -lower
+		or upper < m and highest == upper):
+		return False
+
+	# minimal number of gaps of paths leaving the band
+	gaps = []
+	if upper < m:
+		gaps.append(2 * (upper + 1) - (m - n))
+	if lower < n:
+		gaps.append(2 * (lower + 1) + (m - n))
+	if not gaps:
+		return True
+	if max_score < 0 or 2 * gap_penalty > max_score:
+		return False
+	gaps = min(gaps)
+
+	# best score of paths leaving the band
+	return best > (n + m - gaps) // 2 * max_score + gaps * gap_penalty
+
+
+def fill_python(n, m, pair_score, gap_penalty, lower, upper):
+	"""Returns the origin of each cell of the matrix band, and the score of the last cell
+
+	Only two rows of scores are kept. Origins are stored as one byte per cell
+	in a flat array, cell (x, y) being at x * width + y - x + lower
+	(1 byte instead of 8 for a list slot, plus 28 for each int above 256).
+	"""
+
+	# init band
+	width = lower + upper + 1
+	pointers = array('b', bytes((n+1) * width))
+	prev = [NEG] * width
+	for y in range(0, upper+1):
+		prev[y + lower] = y * gap_penalty
+		pointers[y + lower] = LEFT if y > 0 else 0
+
+	# fill band
+	for x in range(1, n+1):
+		row = [NEG] * width
+		offset = x * width
+		for y in range(max(0, x - lower), min(m, x + upper) + 1):
+			j = y - x + lower
+			# first col
+			if y == 0:
+				row[j] = x * gap_penalty
+				pointers[offset + j] = TOP
+				continue
+			# compute values from top-left diagonal, left and top cells
+			diag = prev[j] + pair_score(x-1, y-1)
+			left = row[j-1] + gap_penalty if j > 0 else NEG
+			top = prev[j+1] + gap_penalty if j+1 < width else NEG
+			# store max and its origin (diagonal, then left, then top on ties)
+			best = max(diag, left, top)
+			row[j] = best
+			pointers[offset + j] = DIAG if diag == best else LEFT if left == best else TOP
+		prev = row
+
+	return pointers, prev[m - n + lower]
 
-	# init matrix
-	rows, cols, matrix = init_matrix(a, b, factor = gap_penalty)
 
-	# fill matrix
-	for x, y in product(range(1, rows), range(1, cols)):
-		# compute values from top, left, and top-left diagonal cells
-		match = matrix[x-1][y-1] + score(a[x-1], b[y-1], scores, submat, mode)
-		insert = matrix[x][y-1] + gap_penalty
-		delete = matrix[x-1][y] + gap_penalty
-		# store maxs
-		matrix[x][y] = max(match, delete, insert)
+def fill_numpy(n, m, pair_score, gap_penalty, lower, upper):
+	"""Returns the origin of each cell of the matrix band, and the score of the last cell
+
+	Same as fill_python, filling rows at once (1 byte per cell instead of 8 for int64).
+	"""
+
+	# init band
+	width = lower + upper + 1
+	pointers = np.zeros((n+1, width), dtype = np.uint8)
+	prev = np.full(width + 1, NEG, dtype = np.int64)
+	row = np.full(width + 1, NEG, dtype = np.int64)
+	prev[lower:width] = np.arange(upper+1) * gap_penalty
+	pointers[0, lower+1:width] = LEFT
+	steps = np.arange(width, dtype = np.int64) * gap_penalty
+
+	# fill band
+	for x in range(1, n+1):
+		first = max(0, x - lower)
+		last = min(m, x + upper)
+		cells = slice(first - x + lower, last - x + lower + 1)
+		size = last - first + 1
+		# top cells
+		top = prev[cells.start+1:cells.stop+1] + gap_penalty
+		# top-left diagonal cells, except in first col
+		skip = 1 if first == 0 else 0
+		diag = np.full(size, NEG, dtype = np.int64)
+		diag[skip:] = np.fromiter((pair_score(x-1, y-1) for y in range(first + skip, last+1)),
+			dtype = np.int64, count = size - skip)
+		diag[skip:] += prev[cells][skip:]
+		# left cells : m[j] = max(best[j], m[j-1] + gap) is a running max
+		best = np.maximum(diag, top)
+		values = np.maximum.accumulate(best - steps[:size]) + steps[:size]
+		left = np.full(size, NEG, dtype = np.int64)
+		left[1:] = values[:-1] + gap_penalty
+		# store origins (diagonal, then left, then top on ties)
+		pointers[x, cells] = np.where(diag == values, DIAG, np.where(left == values, LEFT, TOP))
+		row.fill(NEG)
+		row[cells] = values
+		prev, row = row, prev
+
+	return pointers.ravel(), int(prev[m - n + lower])
+
+
+def traceback(a, b, pointers, lower, upper):
+	"""Returns alignment of sequences a and b from the origins of the matrix band cells
+
+	Also returns the lowest and highest y - x offsets of the path.
+	"""
 
 	# init traceback
+	width = lower + upper + 1
 	align_a = []
 	align_b = []
 	x = len(a)
 	y = len(b)
+	lowest = highest = y - x
 
 	# traceback
 	while x > 0 or y > 0:
-		# retrieve scores
-		current_score = matrix[x][y]
-		topleft_score = matrix[x-1][y-1]
-		left_score = matrix[x][y-1]
-		top_score = matrix[x-1][y]
-		# find origin cell, append corresponding elements, advance
-		if (x > 0 and y > 0
-			and current_score == topleft_score + score(a[x-1], b[y-1], scores, submat, mode)):
+		origin = pointers[x * width + y - x + lower]
+		# append corresponding elements, advance
+		if origin == DIAG:
 			# origin is top-left
 			align_a.append(a[x-1])
 			align_b.append(b[y-1])
 			x = x-1
 			y = y-1
-		elif y > 0 and current_score == left_score + gap_penalty:
+		elif origin == LEFT:
 			# origin is left
 			align_a.append('¤')
 			align_b.append(b[y-1])
 			y = y-1
-		elif x > 0 and current_score == top_score + gap_penalty:
+		elif origin == TOP:
 			# origin is top
 			align_a.append(a[x-1])
 			align_b.append('¤')
 			x = x-1
 		else:
 			raise ValueError('Traceback failed')
+		lowest = min(lowest, y - x)
+		highest = max(highest, y - x)
 
 	# reverse sequence order
 	align_a = align_a[::-1]
 	align_b = align_b[::-1]
 
-	return (align_a, align_b)
+	return (align_a, align_b, (lowest, highest))
+
+
+def needleman_wunsch_linear(a, b, scores = (4, -1, -1), submat = {}, mode = 'word', cache = None):
+	"""Returns alignment of sequences a and b in linear space (Hirschberg)
+
+	Returns the same alignment as needleman_wunsch. The traceback path is split
+	on the middle row : sweeping the bottom half row by row, each cell stores
+	the column where its traceback reaches the middle row, so the column of
+	the path from the last cell is known. Both halves are then solved the same way.
+	Only a few rows are kept per recursion level.
+	"""
+
+	# unpack score parameters
+	_, _, gap_penalty = scores
+
+	# row operations
+	if np is not None and integer_scores(scores, submat):
+		next_row, propagate = next_row_numpy, propagate_numpy
+		first_row = np.arange(len(b)+1, dtype = np.int64) * gap_penalty
+	else:
+		next_row, propagate = next_row_python, propagate_python
+		first_row = [y * gap_penalty for y in range(len(b)+1)]
+	row_scores = row_scorer(a, b, scores, submat, mode, cache)
+
+	# origins of path cells, from last to first cell
+	moves = []
+
+	def solve(first, last, col, top):
+		"""Appends origins of the path from cell (last, col) to row `first`,
+		returns the column where the path reaches row `first`
+
+		:param top: scores of row `first`, up to column col
+		"""
+		# few rows : keep origins of all cells
+		if last - first <= 8:
+			origins = []
+			row = top
+			for x in range(first+1, last+1):
+				row, origin = next_row(row, x, col, row_scores, gap_penalty)
+				origins.append(origin)
+			x, y = last, col
+			while x > first:
+				origin = origins[x - first - 1][y]
+				moves.append(origin)
+				if origin == DIAG:
+					x, y = x-1, y-1
+				elif origin == LEFT:
+					y = y-1
+				else:
+					x = x-1
+			return y
+		# find the column where the path reaches the middle row
+		middle = (first + last) // 2
+		row = top
+		for x in range(first+1, middle+1):
+			row, _ = next_row(row, x, col, row_scores, gap_penalty)
+		middle_row = row
+		exits = range(col+1)
+		for x in range(middle+1, last+1):
+			row, origin = next_row(row, x, col, row_scores, gap_penalty)
+			exits = propagate(exits, origin)
+		middle_col = int(exits[col])
+		# bottom half, then top half
+		solve(middle, last, col, middle_row)
+		return solve(first, middle, middle_col, top[:middle_col+1])
+
+	# path ends along the first row
+	moves.extend([LEFT] * solve(0, len(a), len(b), first_row))
+
+	# build alignment from origins
+	align_a = []
+	align_b = []
+	x = len(a)
+	y = len(b)
+	for origin in moves:
+		if origin == DIAG:
+			align_a.append(a[x-1])
+			align_b.append(b[y-1])
+			x, y = x-1, y-1
+		elif origin == LEFT:
+			align_a.append('¤')
+			align_b.append(b[y-1])
+			y = y-1
+		elif origin == TOP:
+			align_a.append(a[x-1])
+			align_b.append('¤')
+			x = x-1
+		else:
+			raise ValueError('Traceback failed')
+
+	return (align_a[::-1], align_b[::-1])
+
+
+def next_row_python(prev, x, col, row_scores, gap_penalty):
+	"""Returns scores and origins of cells (x, 0) to (x, col) from scores of row x-1"""
+	scores_x = row_scores(x-1)
+	row = [x * gap_penalty]
+	origins = array('b', [TOP])
+	for y in range(1, col+1):
+		diag = prev[y-1] + scores_x[y-1]
+		left = row[y-1] + gap_penalty
+		top = prev[y] + gap_penalty
+		best = max(diag, left, top)
+		row.append(best)
+		origins.append(DIAG if diag == best else LEFT if left == best else TOP)
+	return row, origins
+
+
+def next_row_numpy(prev, x, col, row_scores, gap_penalty):
+	"""Returns scores and origins of cells (x, 0) to (x, col) from scores of row x-1"""
+	steps = np.arange(col+1, dtype = np.int64) * gap_penalty
+	top = prev[:col+1] + gap_penalty
+	diag = np.full(col+1, NEG, dtype = np.int64)
+	diag[1:] = prev[:col] + row_scores(x-1)[:col]
+	# left cells : running max
+	values = np.maximum.accumulate(np.maximum(diag, top) - steps) + steps
+	left = np.full(col+1, NEG, dtype = np.int64)
+	left[1:] = values[:-1] + gap_penalty
+	origins = np.where(diag == values, DIAG, np.where(left == values, LEFT, TOP)).astype(np.uint8)
+	return values, origins
+
+
+def propagate_python(exits, origins):
+	"""Returns, for each cell of a row, the exit column of its origin cell"""
+	res = []
+	for y, origin in enumerate(origins):
+		if origin == DIAG:
+			res.append(exits[y-1])
+		elif origin == LEFT:
+			res.append(res[y-1])
+		else:
+			res.append(exits[y])
+	return res
+
+
+def propagate_numpy(exits, origins):
+	"""Returns, for each cell of a row, the exit column of its origin cell"""
+	exits = np.asarray(exits)
+	res = exits.copy()
+	res[1:] = np.where(origins[1:] == DIAG, exits[:-1], exits[1:])
+	# left origins : exit of the closest cell on the left not coming from the left
+	cols = np.where(origins != LEFT, np.arange(len(origins)), 0)
+	return res[np.maximum.accumulate(cols)]
+
+
+def row_scorer(a, b, scores, submat, mode, cache = None, maxsize = 256):
+	"""Returns a function giving the scores of a[x] and all elements of b
+
+	The scores of the last `maxsize` distinct lowercased elements of a are kept.
+	"""
+	if cache is None and isinstance(submat, SubstitutionTable) and is_chars(a) and is_chars(b):
+		codes_a = submat.codes(a)
+		codes_b = submat.codes(b)
+		table, size = submat.table(scores, mode)
+		vectorized = np is not None and integer_scores(scores, submat)
+
+		@lru_cache(maxsize = maxsize)
+		def code_scores(i):
+			res = [table[i * size + j] for j in codes_b]
+			if vectorized:
+				return np.array(res, dtype = np.int64)
+			return res
+
+		return lambda x: code_scores(codes_a[x])
+	if cache is None:
+		cache = lambda a, b: score(a, b, scores, submat, mode)
+	keys_a = case_keys(a)
+	keys_b = {}
+	idx_b = [keys_b.setdefault(e, len(keys_b)) for e in case_keys(b)]
+	vectorized = np is not None and integer_scores(scores, submat)
+
+	@lru_cache(maxsize = maxsize)
+	def key_scores(key):
+		res = [cache(key, kb) for kb in keys_b]
+		if vectorized:
+			return np.array(res, dtype = np.int64)[idx_b]
+		return [res[i] for i in idx_b]
+
+	return lambda x: key_scores(keys_a[x])
+
+
+def pair_scorer(a, b, scores, submat, mode, cache = None):
+	"""Returns a function giving the score of a[x] and b[y]
+
+	Scores are computed once per pair of distinct lowercased elements,
+	or taken from `cache` when given. Scores of chars are taken from
+	the dense table of a SubstitutionTable.
+	"""
+	if cache is None and isinstance(submat, SubstitutionTable) and is_chars(a) and is_chars(b):
+		rows_a = submat.codes(a)
+		codes_b = submat.codes(b)
+		table, size = submat.table(scores, mode)
+		rows_a = [i * size for i in rows_a]
+		return lambda x, y: table[rows_a[x] + codes_b[y]]
+	if cache is None:
+		cache = lambda a, b: score(a, b, scores, submat, mode)
+	keys_a = {}
+	keys_b = {}
+	idx_a = [keys_a.setdefault(e, len(keys_a)) for e in case_keys(a)]
+	idx_b = [keys_b.setdefault(e, len(keys_b)) for e in case_keys(b)]
+	keys_a = list(keys_a)
+	keys_b = list(keys_b)
+	known = {}
+
+	def pair_score(x, y):
+		key = (idx_a[x], idx_b[y])
+		if key not in known:
+			known[key] = cache(keys_a[key[0]], keys_b[key[1]])
+		return known[key]
+
+	return pair_score
+
+
+def is_chars(seq):
+	"""Returns whether all elements of seq are single chars"""
+	return all(isinstance(e, str) and len(e) == 1 for e in seq)
+
+
+def case_keys(seq):
+	"""Returns lowercased elements of seq, sequences of IDs (array) being lowercased already"""
+	if isinstance(seq, array):
+		return seq
+	return [e.lower() for e in seq]
+
+
+def score_cache(scores = (4, -1, -1), submat = {}, mode = 'words', maxsize = SCORE_CACHE_SIZE, vocab = None):
+	"""Returns score function of lowercased pairs, keeping the last `maxsize` results
+
+	Hit and miss statistics are given by its cache_info() method.
+
+	:param vocab: Vocabulary, pairs are then given as IDs of lowercased forms
+		(sequences to align being arrays of such IDs), its `vocab` attribute
+	"""
+	if vocab is None:
+		@lru_cache(maxsize = maxsize)
+		def cached_score(a, b):
+			return score(a, b, scores, submat, mode)
+	else:
+		forms = vocab.forms
+		@lru_cache(maxsize = maxsize)
+		def cached_score(a, b):
+			return score(forms[a], forms[b], scores, submat, mode)
+	cached_score.vocab = vocab
+	return cached_score
+
+
+def integer_scores(scores, submat):
+	"""Returns whether all scores are integers"""
+	return (all(isinstance(n, int) for n in scores)
+		and all(isinstance(n, int) for row in submat.values() for n in row.values()))
 
 
 def score(a, b, scores, submat, mode):
@@ -204,6 +743,13 @@ def score(a, b, scores, submat, mode):
 		return gap_penalty
 	# mismatch
 	elif (mode == 'words' and len(a) >= 1 and len(b) >= 1):
+		# same word up to diacritics and other substitutions : distance is 0
+		if len(a) == len(b) and all(c == d or d in submat.get(c, ()) for c, d in zip(a, b)):
+			return match_award
+		# skip pairs whose distance is known to be too high
+		if (abs(len(a) - len(b)) >= min(len(a), len(b), 4)
+			or distance_lower_bound(a, b, submat) >= min(len(a), len(b), 4)):
+			return mismatch_penalty
 		dist = levenshtein(a, b, costs = (1, 1, 2), submat = submat)
 		if (dist < min(len(a), len(b)) and dist < 4):
 			return match_award - dist
@@ -215,35 +761,328 @@ def score(a, b, scores, submat, mode):
 
 # distance
 
-def levenshtein(a, b, costs = (1, 1, 1), submat = {}):
-	"""Returns the Levensthein distance between two strings"""
+def levenshtein(a, b, costs = (1, 1, 1), submat = {}, band = None):
+	"""Returns the Levensthein distance between two strings
+
+	Unit costs, with a substitution cost of 1 or 2, use the bit-parallel kernel.
+
+	:param band: margin added to the length difference to get the band width,
+		None to fill the whole matrix
+	"""
+	if tuple(costs) in [(1, 1, 1), (1, 1, 2)]:
+		return levenshtein_bits(a, b, costs, submat)
 	# unpack cost parameters
 	del_cost, ins_cost, sub_cost = costs
-	# init matrix
-	rows, cols, dist = init_matrix(a, b)
-	# fill matrix
-	for x, y in product(range(1, rows), range(1, cols)):
-		if a[x-1] == b[y-1] or a[x-1] in submat and b[y-1] in submat[a[x-1]]:
-			cost = 0
+	# init band
+	n = len(a)
+	m = len(b)
+	if band is None:
+		width = max(n, m)
+	else:
+		width = abs(n - m) + band
+
+	while True:
+		lower = min(width, n)
+		upper = min(width, m)
+		dist = levenshtein_band(a, b, costs, submat, lower, upper)
+		# whole matrix : done
+		if lower == n and upper == m:
+			return dist
+		# paths leaving the band have at least `gaps` insertions or deletions
+		gaps = []
+		if upper < m:
+			gaps.append(2 * (upper + 1) - (m - n))
+		if lower < n:
+			gaps.append(2 * (lower + 1) + (m - n))
+		if dist <= min(gaps) * min(del_cost, ins_cost, 1):
+			return dist
+		# widen band
+		width = 2 * width + 1
+
+
+def levenshtein_band(a, b, costs, submat, lower, upper):
+	"""Returns the Levensthein distance between two strings,
+	only filling cells (x, y) with -lower <= y - x <= upper
+	"""
+	# unpack cost parameters
+	del_cost, ins_cost, sub_cost = costs
+	n = len(a)
+	m = len(b)
+	# init band, cell (x, y) is at dist[x][y - x + lower]
+	width = lower + upper + 1
+	inf = float('inf')
+	prev = [inf] * width
+	for y in range(0, upper+1):
+		prev[y + lower] = y
+	# fill band
+	for x in range(1, n+1):
+		row = [inf] * width
+		for y in range(max(0, x - lower), min(m, x + upper) + 1):
+			j = y - x + lower
+			# first col
+			if y == 0:
+				row[j] = x
+				continue
+			if a[x-1] == b[y-1] or a[x-1] in submat and b[y-1] in submat[a[x-1]]:
+				cost = 0
+			else:
+				cost = sub_cost
+			best = prev[j] + cost
+			if j+1 < width:
+				best = min(best, prev[j+1] + ins_cost)
+			if j > 0:
+				best = min(best, row[j-1] + del_cost)
+			row[j] = best
+		prev = row
+	return prev[m - n + lower]
+
+
+def levenshtein_bits(a, b, costs = (1, 1, 1), submat = {}):
+	"""Returns the Levensthein distance between two strings, for costs (1, 1, 1) or (1, 1, 2)
+
+	Columns of the matrix are computed at once, as bit vectors
+	(Myers / Hyyrö algorithm for costs (1, 1, 1), bit-parallel lcs for (1, 1, 2)).
+	Bit x of masks[c] is set when a[x] and c match (equal or in submat).
+	"""
+	n = len(a)
+	m = len(b)
+	if n == 0 or m == 0:
+		return n + m
+
+	# match masks
+	masks = {}
+	for x, c in enumerate(a):
+		bit = 1 << x
+		masks[c] = masks.get(c, 0) | bit
+		for d in submat.get(c, ()):
+			masks[d] = masks.get(d, 0) | bit
+	full = (1 << n) - 1
+
+	# substitution cost 2 : distance is n + m - 2 * lcs
+	if costs[2] == 2:
+		v = full
+		for c in b:
+			u = v & masks.get(c, 0)
+			v = ((v + u) | (v - u)) & full
+		lcs = n - bin(v).count('1')
+		return n + m - 2 * lcs
+
+	# substitution cost 1 : track vertical deltas (+1 in pv, -1 in mv) of the last column
+	last = 1 << (n-1)
+	pv = full
+	mv = 0
+	dist = n
+	for c in b:
+		eq = masks.get(c, 0)
+		xv = eq | mv
+		xh = (((eq & pv) + pv) ^ pv) | eq
+		ph = mv | (~(xh | pv) & full)
+		mh = pv & xh
+		if ph & last:
+			dist += 1
+		elif mh & last:
+			dist -= 1
+		ph = ((ph << 1) | 1) & full
+		mh = (mh << 1) & full
+		pv = mh | (~(xv | ph) & full)
+		mv = ph & xv
+	return dist
+
+
+def levenshtein_many(pairs):
+	"""Returns levenshtein(a, b) of each (a, b) pair of strings (or of lists of words)
+
+	Pairs are computed by batches of pairs of similar lengths with numpy (levenshtein_batch),
+	with levenshtein_bits without numpy.
+	"""
+	pairs = list(pairs)
+	res = [0] * len(pairs)
+	todo = []
+	for i, (a, b) in enumerate(pairs):
+		if a == b:
+			continue
+		if np is None or len(a) == 0 or len(b) == 0:
+			res[i] = levenshtein_bits(a, b)
 		else:
-			cost = sub_cost
-		substitute = dist[x-1][y-1] + cost
-		insert = dist[x-1][y] + ins_cost
-		delete = dist[x][y-1] + del_cost
-		dist[x][y] = min(substitute, insert, delete)
-	return dist[x][y]
+			todo.append(i)
+	todo.sort(key = lambda i: len(pairs[i][0]))
+	codes = {}
+	for batch in chunked(todo, DISTANCE_BATCH_SIZE):
+		for i, dist in zip(batch, levenshtein_batch([pairs[i] for i in batch], codes)):
+			res[i] = int(dist)
+	return res
+
+
+def levenshtein_batch(pairs, codes):
+	"""Returns levenshtein(a, b) of (a, b) pairs of non empty sequences
+
+	Bit vectors of the Myers / Hyyrö algorithm (see levenshtein_bits) of all pairs
+	are arrays of 64 bits blocks, updated for the y-th element of each b at once,
+	block by block (the horizontal delta at the bottom of a block entering the next one).
+
+	:param codes: integer codes of the elements of lists (words), updated
+	"""
+	# longest b first : pairs whose b has a y-th element are the first ones
+	order = sorted(range(len(pairs)), key = lambda i: -len(pairs[i][1]))
+	pairs = [pairs[i] for i in order]
+	n = np.array([len(a) for a, _ in pairs])
+	m = np.array([len(b) for _, b in pairs])
+	blocks = (n + 63) // 64
+	a = padded_codes([a for a, _ in pairs], n, codes, -1)
+	b = padded_codes([b for _, b in pairs], m, codes, -2)
+	eq_masks, eq_index = match_masks(a, b, n, blocks.max())
+	one = np.uint64(1)
+	size = (len(pairs), blocks.max())
+	# bit of the last row of each block
+	high = np.where(np.arange(size[1]) < blocks[:, None] - 1, 63, (n[:, None] - 1) % 64)
+	high = one << high.astype(np.uint64)
+	last = blocks[:, None] == np.arange(1, size[1] + 1)
+	pv = np.full(size, ~np.uint64(0))
+	mv = np.zeros(size, dtype = np.uint64)
+	dist = n.copy()
+	for y in range(b.shape[1]):
+		k = np.count_nonzero(m > y)
+		eq_blocks = eq_masks[eq_index[:k, y]]
+		# first row : +1
+		hin = np.ones(k, dtype = dist.dtype)
+		for w in range(size[1]):
+			p, v, eq = pv[:k, w], mv[:k, w], eq_blocks[:, w]
+			xv = eq | v
+			eq = eq | (hin < 0).astype(np.uint64)
+			xh = (((eq & p) + p) ^ p) | eq
+			ph = v | ~(xh | p)
+			mh = p & xh
+			hout = (ph & high[:k, w] != 0).astype(dist.dtype) - (mh & high[:k, w] != 0)
+			ph = (ph << one) | (hin > 0).astype(np.uint64)
+			mh = (mh << one) | (hin < 0).astype(np.uint64)
+			pv[:k, w] = mh | ~(xv | ph)
+			mv[:k, w] = ph & xv
+			# distance : delta at the last row of the last block
+			dist[:k] += np.where(last[:k, w], hout, 0)
+			hin = hout
+	# back to the order of pairs
+	res = np.empty_like(dist)
+	res[order] = dist
+	return res
+
+
+def match_masks(a, b, n, blocks):
+	"""Returns (masks, index) of padded codes of sequences a and b (from padded_codes)
+
+	masks[index[i, y]] are the 64 bits blocks of the match mask of b[i, y] in a[i]
+	(bit x of block w set when a[i, 64 * w + x] == b[i, y]).
+	"""
+	# (pair, element) keys of a and b
+	base = max(a.max(), b.max()) + 1
+	rows = np.arange(len(a))[:, None]
+	x = np.arange(a.shape[1])
+	in_a = x < n[:, None]
+	keys_a = (rows * base + a)[in_a]
+	keys, inverse = np.unique(keys_a, return_inverse = True)
+	# masks of the elements of a, a last zero mask for others
+	masks = np.zeros((len(keys) + 1, blocks), dtype = np.uint64)
+	positions = np.broadcast_to(x, a.shape)[in_a]
+	np.bitwise_or.at(masks, (inverse, positions // 64), np.uint64(1) << (positions % 64).astype(np.uint64))
+	keys_b = rows * base + b
+	index = np.searchsorted(keys, keys_b)
+	index[(index == len(keys)) | (keys[np.minimum(index, len(keys) - 1)] != keys_b) | (b < 0)] = len(keys)
+	return masks, index
+
+
+def padded_codes(seqs, lengths, codes, pad, width = None):
+	"""Returns a 2D array of the integer codes of sequences (code points of strings), padded with pad
+
+	:param width: number of columns, the longest length if None
+	"""
+	if all(isinstance(s, str) for s in seqs):
+		flat = np.frombuffer(''.join(seqs).encode('utf-32-le'), dtype = np.uint32)
+	else:
+		flat = np.fromiter((codes.setdefault(e, len(codes)) for s in seqs for e in s), dtype = np.int64)
+	res = np.full((len(seqs), width or lengths.max()), pad, dtype = np.int64)
+	res[np.arange(res.shape[1]) < lengths[:, None]] = flat
+	return res
+
+
+def distance_lower_bound(a, b, submat = {}):
+	"""Returns a lower bound of levenshtein(a, b, (1, 1, 2), submat)
+
+	With a substitution cost of 2, the distance is len(a) + len(b) - 2 * lcs,
+	and the lcs is at most the number of chars of a matching some char of b.
+	"""
+	chars_b = set(b)
+	matching = sum(1 for c in a if c in chars_b or not chars_b.isdisjoint(submat.get(c, ())))
+	return len(a) + len(b) - 2 * min(matching, len(b))
 
 
 # substitution matrix
 
+class SubstitutionTable(dict):
+	"""Substitution matrix (dict of dicts), with dense tables of the scores of char pairs
+
+	Built like a dict with add_to_submat. Chars get small indices when first seen,
+	a char and its lowercased form sharing the same index. The scores of pairs
+	of indices are kept in a flat list, at i * size + j (one per score parameters).
+	"""
+
+	def __init__(self, *args):
+		super().__init__(*args)
+		self.clear_tables()
+
+	def clear_tables(self):
+		self.index = {}
+		self.chars = []
+		self.tables = {}
+
+	def codes(self, s):
+		"""Returns indices of the chars of s"""
+		index = self.index
+		res = []
+		for c in s:
+			i = index.get(c)
+			if i is None:
+				key = c.lower()
+				i = index.get(key)
+				if i is None:
+					i = index[key] = len(self.chars)
+					self.chars.append(c)
+				index[c] = i
+			res.append(i)
+		return res
+
+	def table(self, scores = (4, -1, -1), mode = 'word'):
+		"""Returns the scores of all pairs of indices, and the size of table rows"""
+		key = (tuple(scores), mode)
+		table, size, done = self.tables.get(key, ([], 0, 0))
+		n = len(self.chars)
+		if done < n:
+			# grow rows
+			if size < n:
+				new_size = max(16, 2 * n)
+				new_table = [0] * (new_size * new_size)
+				for i in range(done):
+					new_table[i*new_size:i*new_size+done] = table[i*size:i*size+done]
+				table, size = new_table, new_size
+			# scores of new chars
+			chars = self.chars
+			for i in range(done, n):
+				for j in range(n):
+					table[i*size + j] = score(chars[i], chars[j], scores, self, mode)
+					table[j*size + i] = score(chars[j], chars[i], scores, self, mode)
+			self.tables[key] = (table, size, n)
+		return table, size
+
+
 def add_to_submat(a, b, n, submat):
 	if a not in submat:
 		submat[a] = {b: n}
 	else:
 		submat[a].update({b: n})
+	# compiled tables are outdated
+	if isinstance(submat, SubstitutionTable):
+		submat.clear_tables()
 
 def init_submat_chars():
-	submat = {}
+	submat = SubstitutionTable()
 	# diacritics
 	add_to_submat('a', 'à', 2, submat)
 	add_to_submat('a', 'â', 2, submat)
@@ -290,18 +1129,6 @@ def init_submat_words():
 	return submat
 
 
-"""
-# evaluation
-# deactivated to avoid installing ASR_metrics
-def cacc(lst):
-  return 1
-	#return 1 - sum(metrics.calculate_cer(mod, new) for (mod, new) in lst) / len(lst)
-
-def wacc(lst):
-	return 1
-	#return 1 - sum(metrics.calculate_wer(mod, new) for (mod, new) in lst) / len(lst)
-"""
-
 # tools
 
 def init_matrix(a, b, factor = 1):
@@ -326,27 +1153,19 @@ def init_matrix(a, b, factor = 1):
 	return rows, cols, matrix
 
 def preprocess_tsv(s):
-	s = link_hyphens(s)
-	s = separate_apostrophe (s)
-	s = separate_punctuation (s)
-	s = s.replace("'","’")
-	# split on all whitespace
-	return s.split()
-
-def link_hyphens(s):
-	# TRES- CHRESTIENNE → TRES-CHRESTIENNE
-	return s.replace('-', '- ')
-
-def separate_apostrophe(s):
-	return s.replace('’', '’ ').replace('\'', '\' ')
-
-def separate_punctuation(s):
-	# symbols to treat as single tokens (apostrophe and hyphen not counted)
-	punctuation = '!"\\()*,./:;>?[]^«¬»„…'
-	# separate these symbols in the string (add space before and after)
-	for char in punctuation:
-		# s = s.replace(char, ' ' + char + ' ')
-		s = s.replace(char, ' ')
-	# special case for ... (put consecutive periods back together)
-	s = s.replace('.  .  .', '...')
-	return s
\ No newline at end of file
+	# split on whitespace and punctuation, unify apostrophes
+	return [token for (token, _, _) in tokenize(s)]
+
+def tokenize(s, tags=False):
+	"""Returns (token, start, end) for each word token of s, s[start:end] being the original token
+
+	Tokens are separated by whitespace and punctuation, and end after hyphens
+	and apostrophes (TRES-CHRESTIENNE → TRES- CHRESTIENNE, l'homme → l’ homme).
+	Apostrophes are unified to ’.
+	:param tags: if True, tags are not tokens
+	"""
+	if tags:
+		return [(match.group(1).replace("'", "’"), match.start(), match.end())
+			for match in TOKENS_TAGS.finditer(s) if match.group(1)]
+	return [(match.group().replace("'", "’"), match.start(), match.end())
+		for match in TOKENS.finditer(s)]
\ No newline at end of file
@@ -1,4 +1,7 @@
-from aba.utils.strings import needleman_wunsch, levenshtein, add_to_submat, init_matrix
+import multiprocessing
+
+from aba.utils.vocab import Vocabulary
+from aba.utils.strings import needleman_wunsch, needleman_wunsch_python, needleman_wunsch_linear, levenshtein, levenshtein_bits, levenshtein_band, distance_lower_bound, add_to_submat, init_submat_chars, init_matrix, score_cache, align_words, align_chars, SubstitutionTable, init_align_worker, tokenize, preprocess_tsv, levenshtein_many
 
 def test_init_matrix():
 	a = 'a'
@@ -20,4 +23,96 @@ def test_needleman_wunsch():
 	a = 'cét'
 	b = 'cette'
 	align = (['c', 'é', '¤', 't', '¤'], ['c', 'e', 't', 't', 'e'])
-	assert needleman_wunsch(a, b, submat = submat) == align
\ No newline at end of file
+	assert needleman_wunsch(a, b, submat = submat) == align
+
+def test_needleman_wunsch_engines():
+	submat = init_submat_chars()
+	a = 'Il eſt vn grand Roy & auoir faict ſes loix'.split()
+	b = 'Il est un roi et avoir fait ses lois'.split()
+	align = needleman_wunsch_python(a, b, submat = submat, mode = 'words')
+	assert needleman_wunsch(a, b, submat = submat, mode = 'words') == align
+	assert align == (
+		['Il', 'eſt', 'vn', 'grand', 'Roy', '&', 'auoir', 'faict', 'ſes', 'loix'],
+		['Il', 'est', 'un', '¤', 'roi', 'et', 'avoir', 'fait', 'ses', 'lois'])
+
+def test_distance_lower_bound():
+	submat = init_submat_chars()
+	for a, b in [('eſt', 'est'), ('auoir', 'avoir'), ('faict', 'fait'), ('abc', 'xyz')]:
+		assert distance_lower_bound(a, b, submat) <= levenshtein(a, b, (1, 1, 2), submat)
+
+def test_tokenize():
+	s = "TRES-CHRESTIENNE, l'homme <i>eſt</i>"
+	assert preprocess_tsv(s) == ['TRES-', 'CHRESTIENNE', 'l’', 'homme', '<i', 'eſt<', 'i']
+	tokens = tokenize(s, tags=True)
+	assert [token for token, _, _ in tokens] == ['TRES-', 'CHRESTIENNE', 'l’', 'homme', 'eſt']
+	assert [s[start:end] for _, start, end in tokens] == ['TRES-', 'CHRESTIENNE', "l'", 'homme', 'eſt']
+
+def test_band():
+	submat = init_submat_chars()
+	a = 'vn grand roy de France'.split()
+	b = 'et puis un roi de France'.split()
+	for band in [0, 1, 8]:
+		assert needleman_wunsch(a, b, submat = submat, mode = 'words', band = band) == needleman_wunsch(a, b, submat = submat, mode = 'words')
+		assert needleman_wunsch_python(a, b, submat = submat, mode = 'words', band = band) == needleman_wunsch(a, b, submat = submat, mode = 'words')
+		assert levenshtein('abcdefghij', 'xxxxabcdefgij', band = band) == 5
+
+def test_levenshtein_bits():
+	submat = init_submat_chars()
+	for a, b in [('eſt', 'est'), ('auoir', 'avoir'), ('faict', 'fait'), ('abc', 'xyz'), ('vn', 'un'), ('a', 'bcd')]:
+		for costs in [(1, 1, 1), (1, 1, 2)]:
+			assert levenshtein_bits(a, b, costs, submat) == levenshtein_band(a, b, costs, submat, len(a), len(b))
+
+def test_score_cache():
+	submat = init_submat_chars()
+	cache = score_cache(submat = submat, mode = 'words')
+	a = 'Il eſt vn grand Roy'.split()
+	b = 'Il est un roi'.split()
+	align = needleman_wunsch(a, b, submat = submat, mode = 'words')
+	assert needleman_wunsch(a, b, submat = submat, mode = 'words', cache = cache) == align
+	assert needleman_wunsch(a, b, submat = submat, mode = 'words', cache = cache) == align
+	assert cache.cache_info().hits > 0
+	assert cache('eſt', 'est') == cache('auoir', 'avoir') == 4
+
+def test_substitution_table():
+	submat = init_submat_chars()
+	assert isinstance(submat, SubstitutionTable)
+	for s, t in [('Il eſt', 'il est'), ('AVOIR', 'auoir'), ('Œuure', 'oeuvre')]:
+		assert align_chars(s, t, submat) == align_chars(s, t, dict(submat))
+	table, size = submat.table()
+	assert table[submat.codes('ſ')[0] * size + submat.codes('S')[0]] == 2
+	add_to_submat('x', 'ſ', 1, submat)
+	assert submat.tables == {}
+
+def test_vocabulary():
+	submat = init_submat_chars()
+	vocab = Vocabulary()
+	cache = score_cache(submat = submat, mode = 'words', vocab = vocab)
+	a = 'Il eſt vn grand Roy'.split()
+	b = 'Il est un roi'.split()
+	ids_a = vocab.encode(a)
+	assert vocab.decode(ids_a) == a
+	assert vocab.decode(vocab.fold(ids_a)) == [e.lower() for e in a]
+	align_a, align_b = needleman_wunsch(vocab.fold(ids_a), vocab.fold(vocab.encode(b)), submat = submat, mode = 'words', cache = cache)
+	assert ([e if e == '¤' else vocab.forms[e] for e in align_b]
+		== [e.lower() for e in needleman_wunsch(a, b, submat = submat, mode = 'words')[1]])
+
+def test_needleman_wunsch_linear():
+	submat = init_submat_chars()
+	a = 'Il eſt vn grand Roy & auoir faict ſes loix en ſon Royaume de France'.split()
+	b = 'Il est un roi et avoir fait ses lois dans son royaume de France'.split()
+	align = needleman_wunsch(a, b, submat = submat, mode = 'words')
+	assert needleman_wunsch_linear(a, b, submat = submat, mode = 'words') == align
+	assert needleman_wunsch(a, b, submat = submat, mode = 'words', max_cells = 10) == align
+	assert needleman_wunsch_linear('cét', 'cette', submat = {'é': {'e': 2}}) == needleman_wunsch('cét', 'cette', submat = {'é': {'e': 2}})
+
+def test_align_words_pool(tmp_path):
+	file = tmp_path / 'corpus.tsv'
+	file.write_text(
+		'Il eſt vn grand Roy\tIl est un grand roi\n'
+		'& auoir faict ſes loix\tet avoir fait ses lois\n' * 100, encoding = 'utf8')
+	with multiprocessing.Pool(2, initializer = init_align_worker) as pool:
+		assert list(align_words(file, pool = pool)) == list(align_words(file))
+
+def test_levenshtein_many():
+	pairs = [('chat', 'chats'), ('a' * 100, 'b' + 'a' * 130), ('', 'abc'), ('roy', 'roy'), (['le', 'roy'], ['le', 'roi', 'est'])]
+	assert levenshtein_many(pairs) == [levenshtein(a, b) for a, b in pairs] == [1, 31, 3, 0, 2]
\ No newline at end of file
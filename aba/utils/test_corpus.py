@@ -0,0 +1,14 @@
+from aba.utils.corpus import CorpusFile
+
+def test_corpus_file(tmp_path):
+	path = tmp_path / 'a.tsv'
+	path.write_text('Roy\troi\r\neſt\test\n\nvn\tun', encoding = 'utf8')
+	with CorpusFile(path) as corpus_file:
+		assert list(corpus_file) == ['Roy\troi', 'eſt\test', '', 'vn\tun']
+		assert corpus_file[1:3] == ['eſt\test', ''] and corpus_file[-1] == 'vn\tun'
+		assert corpus_file.fold(1, 2) == (2, 4)
+		assert corpus_file.sample(2, 1, 4, seed = 0) == corpus_file.sample(2, 1, 4, seed = 0)
+	# saved index, used while the file is unchanged
+	assert CorpusFile(path).read_index(path.stat()) is not None
+	path.write_text('le\tle\n', encoding = 'utf8')
+	assert list(CorpusFile(path)) == ['le\tle']
\ No newline at end of file
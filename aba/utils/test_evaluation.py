@@ -0,0 +1,10 @@
+from aba.utils.evaluation import evaluate
+
+def test_evaluate():
+	pairs = [('le roy', 'le roi'), ('est', 'est'), ('auoir', 'avoir')]
+	res = evaluate(pairs, files = ['a', 'a', 'b'], buckets = (4, 8))
+	assert abs(res['cacc'] - (1 - (1/5 + 0 + 1/5) / 3)) < 1e-12
+	assert abs(res['wacc'] - (1 - (1/2 + 0 + 1) / 3)) < 1e-12
+	assert res['files']['b'] == {'cacc': 0.8, 'wacc': 0.0, 'pairs': 1}
+	assert list(res['lengths']) == ['0-4', '5-8'] and res['lengths']['0-4']['pairs'] == 1
+	assert evaluate(pairs, jobs = 2)['cacc'] == res['cacc']
\ No newline at end of file
@@ -0,0 +1,102 @@
+from aba.utils.modern import Modernizer, read_dics, modernize_sentence, modernize, apply_rules, find_diffs, label_pairs, alignment_memo, label_dic, read_labeled_dic
+from aba.utils.bundle import build_bundle, load_bundle
+from aba.utils.memo import WordMemo
+from aba.modernize_corpus import generate_data, generate_folds, cross_validate
+
+def test_modernizer():
+	modern_dic = {'le', 'roi', 'est', 'homme', 'dit', 'il'}
+	learn_dic = {'Roy': 'Roi', 'eſt': 'est'}
+	modernizer = Modernizer(modern_dic, learn_dic, rules = False)
+	s = "Le Roy eſt l'homme, dit-il."
+	assert modernizer.modernize_sentence(s) == "Le Roi est l'homme, dit-il."
+	assert list(modernizer.modernize_many([s, 'Roy'])) == [modernize_sentence(s, modern_dic, learn_dic), 'Roi']
+	assert modernizer.modernize_word.cache_info().hits > 0
+	mods, stats = modernizer.modernize_vocabulary_first([s, 'Roy'])
+	assert mods == [modernizer.modernize_sentence(s), 'Roi']
+	assert (stats['tokens'], stats['types']) == (8, 7)
+
+def test_bundle(tmp_path):
+	modern_dic = {'le', 'roi', 'est', 'homme', 'dit', 'il'}
+	learn_dic = {'Roy': 'Roi', 'eſt': 'est'}
+	name_dic = {'Paris'}
+	build_bundle(tmp_path / 'dics.bundle', modern_dic, learn_dic, name_dic)
+	modern, learn, name = load_bundle(tmp_path / 'dics.bundle')
+	assert 'roi' in modern and 'roy' not in modern and len(modern) == 6
+	assert learn['eſt'] == 'est' and learn.get('Roi') is None
+	assert 'Paris' in name
+	s = "Le Roy eſt à Paris"
+	assert (Modernizer(modern, learn, name).modernize_sentence(s)
+		== Modernizer(modern_dic, learn_dic, name_dic).modernize_sentence(s))
+	assert Modernizer.from_bundle(tmp_path / 'dics.bundle', max_candidates = 2).max_candidates == 2
+	# most frequent variant of the learned dictionary (sorted by pair, like dic_p17.tsv)
+	(tmp_path / 'modern.txt').write_text('le\nroi\nest\n', encoding = 'utf8')
+	(tmp_path / 'names.txt').write_text('Paris\n', encoding = 'utf8')
+	(tmp_path / 'learn.tsv').write_text('Roy\tRoi\t3\nRoy\tRoy2\t1\neſt\test\t1\n', encoding = 'utf8')
+	dics = read_dics(tmp_path / 'modern.txt', tmp_path / 'learn.tsv', tmp_path / 'names.txt')
+	assert dics[1] == {'Roy': 'Roi', 'eſt': 'est'}
+	build_bundle(tmp_path / 'p17.bundle', *dics)
+	assert Modernizer.from_bundle(tmp_path / 'p17.bundle').modernize_sentence('Le Roy eſt') == 'Le Roi est'
+
+
+def test_memo(tmp_path):
+	path = tmp_path / 'memo.sqlite'
+	memo = WordMemo(path, 'a', max_size = 2)
+	modernizer = Modernizer({'est'}, {'Roy': 'Roi', 'eſt': 'est'}, rules = False, memo = memo)
+	assert modernizer.modernize_sentence('Roy eſt') == 'Roi est'
+	memo.put('auoir', 'avoir')
+	memo.close()
+	memo = WordMemo(path, 'a', max_size = 2)
+	assert len(memo) == 2 and memo.get('auoir') == 'avoir'
+	memo.close()
+	assert len(WordMemo(path, 'b')) == 0
+
+
+def test_apply_rules():
+	mods = list(apply_rules('deuoit'))
+	assert mods[0] == 'deuoit' and 'devait' in mods and len(mods) == len(set(mods))
+	assert list(apply_rules('deuoit', max_candidates = 2)) == mods[:2]
+	assert modernize('deuoit', {'devait'}, {}) == 'devait'
+	assert modernize('deuoit', {'devait'}, {}, max_candidates = 1) == 'deuoit'
+
+
+def test_find_diffs():
+	assert find_diffs('auecques', 'avec¤¤¤¤') == (2, [('u', 'v', ['lettre ramiste']), ('ques', '¤¤¤¤', ['cque/que → c'])])
+	assert find_diffs('Roy', 'roi') == (1, [('y', 'i', ['lettre calligraphique'])])
+	assert find_diffs('fortz', 'fort¤')[1] == [('z', '¤', [])]
+
+
+def test_label_pairs(tmp_path):
+	pairs = [('auecques', 'avec'), ('Roy', 'roi'), ('auecques', 'avec')]
+	memo = alignment_memo(tmp_path / 'alignments.sqlite')
+	labeled = list(label_pairs(pairs, memo = memo, chunk_size = 2))
+	assert labeled[0] == labeled[2] == ('auecques', 'avec¤¤¤¤', find_diffs('auecques', 'avec¤¤¤¤'))
+	assert memo.get('Roy\troi') == 'Roy\troi'
+	assert list(label_pairs(pairs, jobs = 2)) == labeled
+
+
+def test_cross_validate(tmp_path):
+	(tmp_path / 'a.tsv').write_text('Roy\troi\neſt\test\nvn\tun\n', encoding = 'utf8')
+	(tmp_path / 'b.tsv').write_text('le\tle\nRoy\troi\n', encoding = 'utf8')
+	learn, test, files = generate_data(str(tmp_path), ratio = 0.5)
+	assert sorted(set(files)) == ['a.tsv', 'b.tsv'] and len(files) == len(test)
+	folds = list(generate_folds(str(tmp_path), 2))
+	assert [(k, learn, test) for k, learn, test, _ in folds] == [
+		(1, {'eſt': 'est', 'vn': 'un', 'Roy': 'roi'}, [('Roy', 'roi'), ('le', 'le')]),
+		(2, {'Roy': 'roi', 'le': 'le'}, [('eſt', 'est'), ('vn', 'un'), ('Roy', 'roi')])]
+	assert [len(test) for _, _, test, _ in generate_folds(str(tmp_path), 2, sample = 1)] == [2, 2]
+	results = list(cross_validate(str(tmp_path), 2, {'roi', 'est', 'un', 'le'}, {}, set()))
+	assert [res['rules']['cacc'] for res in results] == [1.0, 1.0]
+	assert results[1]['wikisource']['wacc'] == 0.0
+	assert list(cross_validate(str(tmp_path), 2, {'roi', 'est', 'un', 'le'}, {}, set(), jobs = 2))[1]['rules'] == results[1]['rules']
+
+
+def test_label_dic(tmp_path):
+	(tmp_path / 'dic.txt').write_text('auoir\tavoir\t1\nroy\troi\t2\n', encoding = 'utf8')
+	label_dic(tmp_path / 'dic.txt', tmp_path / 'lab.txt')
+	# labeled rows of known entries are reused
+	labeled = read_labeled_dic(tmp_path / 'lab.txt', tmp_path / 'dic.txt')
+	assert list(labeled) == [('auoir', 'avoir'), ('roy', 'roi')]
+	(tmp_path / 'dic2.txt').write_text('auoir\tavoir\t1\nfaict\tfait\t1\nroy\troi\t3\n', encoding = 'utf8')
+	label_dic(tmp_path / 'dic2.txt', tmp_path / 'lab2.txt', labeled = labeled)
+	label_dic(tmp_path / 'dic2.txt', tmp_path / 'full_lab.txt')
+	assert (tmp_path / 'lab2.txt').read_text(encoding = 'utf8') == (tmp_path / 'full_lab.txt').read_text(encoding = 'utf8')
\ No newline at end of file
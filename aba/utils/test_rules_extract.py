@@ -0,0 +1,36 @@
+from aba.rules_extract import file_rules, extract_rules, count_rules, write_rule_matrix
+from aba.utils.saving import extract_dic
+from aba.utils.modern import label_dic
+
+def test_file_rules(tmp_path):
+	corpus, words = tmp_path / 'corpus', tmp_path / 'words'
+	corpus.mkdir()
+	(corpus / 'a.tsv').write_text(
+		'Il eſt vn grand Roy\tIl est un grand roi\n'
+		'& auoir faict ſes loix\tet avoir fait ses lois\n'
+		'ligne sans colonnes\n', encoding = 'utf8')
+	(corpus / 'b.tsv').write_text('Le Roy\tLe roi\n', encoding = 'utf8')
+	files = [str(corpus / 'a.tsv'), str(corpus / 'b.tsv')]
+	results = list(extract_rules(files, str(words)))
+	assert list(extract_rules(files, jobs = 2)) == results
+	# (no line index left next to corpus files)
+	assert sorted(f.name for f in corpus.iterdir()) == ['a.tsv', 'b.tsv']
+	# same rows as the dictionary of the saved word alignment, labeled
+	size, rows = results[0]
+	assert size == 10
+	(tmp_path / 'dic').mkdir()
+	(tmp_path / 'dic' / 'a.tsv').write_text((words / 'a.tsv').read_text(encoding = 'utf8'), encoding = 'utf8')
+	extract_dic(str(tmp_path / 'dic'), tmp_path / 'dic.txt')
+	label_dic(tmp_path / 'dic.txt', tmp_path / 'lab.txt')
+	assert (tmp_path / 'lab.txt').read_text(encoding = 'utf8') == ''.join('\t'.join(map(str, row)) + '\n' for row in rows)
+	# rule frequencies
+	rule_counts = [count_rules(rows) for _, rows in results]
+	assert rule_counts[1] == {"['lettre calligraphique']": 1}
+	write_rule_matrix(rule_counts, [size for size, _ in results], tmp_path / 'rules.csv')
+	matrix = (tmp_path / 'rules.csv').read_text(encoding = 'utf8').split('\n')
+	assert matrix[0].split(';')[:2] == ['[esperluette]', '[lettre calligraphique]']
+	assert matrix[2] == '0.0;0.5;' + '0.0;' * (len(matrix[0].split(';')) - 2)
+	# saved word alignments are reused with reuse_words
+	(words / 'b.tsv').write_text('Le\tLe\nRoy\tRoi', encoding = 'utf8')
+	assert file_rules(str(corpus / 'b.tsv'), str(words), reuse_words = True)[1][0][:2] == ('Roy', 'Roi')
+	assert file_rules(str(corpus / 'b.tsv'), str(words))[1][0][:2] == ('Roy', 'roi')
\ No newline at end of file
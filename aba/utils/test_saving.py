@@ -0,0 +1,21 @@
+from aba.utils.saving import extract_dic, extract_dic_incremental
+
+def test_extract_dic(tmp_path):
+	(tmp_path / 'a.tsv').write_text('roy\troi\nroy\troy\nroy\troi\n', encoding = 'utf8')
+	(tmp_path / 'b.tsv').write_text('roy\troys\nauoir\tavoir\n', encoding = 'utf8')
+	expected = 'auoir\tavoir\t1\nroy\troi\t2\nroy\troys\t1\n'
+	for jobs, max_pairs in ((1, 100), (2, 100), (1, 1)):
+		extract_dic(str(tmp_path), tmp_path / 'dic.txt', jobs = jobs, max_pairs = max_pairs)
+		assert (tmp_path / 'dic.txt').read_text(encoding = 'utf8') == expected
+
+def test_extract_dic_incremental(tmp_path):
+	src = tmp_path / 'src'
+	src.mkdir()
+	(src / 'a.tsv').write_text('roy\troi\nroy\troi\nauoir\tavoir\n', encoding = 'utf8')
+	dic, manifest = str(tmp_path / 'dic.txt'), str(tmp_path / 'manifest.json')
+	assert len(extract_dic_incremental(str(src), dic, manifest)) == 1
+	(src / 'b.tsv').write_text('roy\troi\nfaict\tfait\n', encoding = 'utf8')
+	assert len(extract_dic_incremental(str(src), dic, manifest)) == 1
+	extract_dic(str(src), tmp_path / 'full.txt')
+	assert open(dic, encoding = 'utf8').read() == (tmp_path / 'full.txt').read_text(encoding = 'utf8')
+	assert extract_dic_incremental(str(src), dic, manifest) == []
\ No newline at end of file
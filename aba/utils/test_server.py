@@ -0,0 +1,51 @@
+import json
+import asyncio
+
+from aba.utils.modern import Modernizer
+from aba.utils.server import start_server, batch_loop
+
+async def post(port, body, content_type):
+	reader, writer = await asyncio.open_connection('127.0.0.1', port)
+	body = body.encode('utf8')
+	writer.write(f'POST /modernize HTTP/1.1\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body)
+	response = await reader.read()
+	writer.close()
+	return response.split(b'\r\n\r\n', 1)[1].decode('utf8')
+
+def test_server():
+	modernizer = Modernizer({'le', 'roi', 'est'}, {'Roy': 'Roi', 'eſt': 'est'}, rules = False)
+
+	async def main():
+		server, = await start_server(modernizer, '127.0.0.1', 0)
+		port = server.sockets[0].getsockname()[1]
+		texts = await asyncio.gather(*[post(port, f'Le Roy eſt {i}', 'text/plain') for i in range(10)])
+		assert texts == [f'Le Roi est {i}' for i in range(10)]
+		batch = await post(port, json.dumps(['Le Roy', 'eſt']), 'application/json')
+		assert json.loads(batch) == {'sentences': ['Le Roi', 'est']}
+		# bad content length : answered, counted as an error
+		reader, writer = await asyncio.open_connection('127.0.0.1', port)
+		writer.write(b'POST /modernize HTTP/1.1\r\nContent-Length: abc\r\n\r\n')
+		assert (await reader.read()).startswith(b'HTTP/1.1 400')
+		writer.close()
+		server.close()
+
+	asyncio.run(main())
+
+
+def test_batch_loop_cancelled():
+	modernizer = Modernizer({'roi'}, {'Roy': 'Roi'}, rules = False)
+
+	async def main():
+		queue = asyncio.Queue()
+		metrics = {'batches': 0}
+		batcher = asyncio.create_task(batch_loop(queue, modernizer, 64, 0.005, metrics))
+		loop = asyncio.get_running_loop()
+		cancelled, future = loop.create_future(), loop.create_future()
+		cancelled.cancel()
+		await queue.put((['Roy'], cancelled))
+		await queue.put((['Roy'], future))
+		assert await future == ['Roi']
+		assert not batcher.done()
+		batcher.cancel()
+
+	asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,47 @@
+# vocab.py
+
+from array import array
+
+# gap element of aligned sequences
+GAP = '¤'
+
+
+class Vocabulary:
+	"""Interned word forms, each mapped once to an integer ID
+
+	Sequences of words are stored as array('I') of IDs. The ID of the lowercased
+	form of each form is kept in `lower`, so sequences are case-folded by lookups.
+	"""
+
+	def __init__(self):
+		self.ids = {}
+		self.forms = []
+		self.lower = array('I')
+
+	def __len__(self):
+		return len(self.forms)
+
+	def id(self, form):
+		"""Returns the ID of form, adding form (and its lowercased form) if new"""
+		i = self.ids.get(form)
+		if i is None:
+			low = form.lower()
+			j = self.id(low) if low != form else len(self.forms)
+			i = self.ids[form] = len(self.forms)
+			self.forms.append(form)
+			self.lower.append(j)
+		return i
+
+	def encode(self, forms):
+		"""Returns IDs of forms"""
+		return array('I', map(self.id, forms))
+
+	def fold(self, ids):
+		"""Returns IDs of the lowercased forms"""
+		lower = self.lower
+		return array('I', [lower[i] for i in ids])
+
+	def decode(self, ids):
+		"""Returns forms of IDs"""
+		forms = self.forms
+		return [forms[i] for i in ids]
\ No newline at end of file